@@ -2,9 +2,16 @@
 # GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 
 import copy
-import json
+import traceback
 
+from ansible.module_utils.common.arg_spec import ArgumentSpecValidator
+from ansible.module_utils.common.text.converters import to_text
 from ansible.plugins.action import ActionBase
+from ansible_collections.pravic.pravic.plugins.module_utils.exception import CloudException
+from ansible_collections.pravic.pravic.plugins.module_utils.resource import state_keys
+from ansible_collections.pravic.pravic.plugins.module_utils.runner import ARG_SPEC, make_client, run_client
+from ansible_collections.pravic.pravic.plugins.plugin_utils import daemon
+from ansible_collections.pravic.pravic.plugins.plugin_utils.state import get_backend
 
 
 class ActionModule(ActionBase):
@@ -12,12 +19,46 @@ class ActionModule(ActionBase):
         super().run(tmp, task_vars)
         module_args = copy.deepcopy(self._task.args)
 
-        try:
-            state_file = task_vars.get("state_file")
-            with open(state_file) as fp:
-                current_state = json.load(fp)
-        except Exception:
-            current_state = {}
+        # only ship the part of the state the task reads, the callback merges
+        # the returned resources back into the state file
+        resources = module_args.get("resources")
+        keys = state_keys(resources) if isinstance(resources, dict) else None
+        current_state = {}
+        state_file = task_vars.get("state_file")
+        if state_file:
+            # running against an empty state would recreate every resource
+            try:
+                current_state = get_backend(task_vars.get("state_backend"), state_file).load(keys)
+            except Exception as e:
+                return {"failed": True, "msg": "Failed to load the state from {0}: {1}".format(state_file, to_text(e))}
 
         module_args["current_state"] = current_state
-        return self._execute_module(module_name=self._task.action, module_args=module_args, task_vars=task_vars)
+        execution = module_args.get("execution")
+        if execution in ("controller", "daemon"):
+            validated = ArgumentSpecValidator(ARG_SPEC).validate(module_args)
+            if validated.error_messages:
+                return {"failed": True, "msg": "; ".join(validated.error_messages)}
+            params = validated.validated_parameters
+            check_mode = bool(self._play_context.check_mode)
+            if execution == "controller":
+                result = self._run_controller(params, check_mode)
+            else:
+                result = self._run_daemon(params, check_mode)
+        else:
+            result = self._execute_module(module_name=self._task.action, module_args=module_args, task_vars=task_vars)
+
+        if not result.get("failed") and isinstance(resources, dict):
+            result["removed"] = [name for name in resources if name in current_state and name not in result.get("resources", {})]
+        return result
+
+    def _run_controller(self, params, check_mode):
+        try:
+            return run_client(make_client(params, check_mode), params, check_mode)
+        except CloudException as e:
+            return {"failed": True, "msg": to_text(e), "exception": "".join(traceback.format_exception(None, e, e.__traceback__))}
+
+    def _run_daemon(self, params, check_mode):
+        try:
+            return daemon.execute(params, check_mode)
+        except (OSError, ValueError) as e:
+            return {"failed": True, "msg": "Failed to run the task in the pravic daemon: {0}".format(to_text(e))}
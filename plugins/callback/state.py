@@ -7,12 +7,21 @@ DOCUMENTATION = """
     short_description: gathers resources state
     description:
       - Ansible callback plugin for collecting the resources state
+      - The state is stored in the file set by the C(state_file) variable.
+      - The C(state_backend) variable selects how the state is stored. With
+        C(json), the default, the whole state file is rewritten after every
+        task. With C(journal), the changes are appended to a journal next to
+        the state file, which is compacted into the state file once the
+        journal outgrows it and at the end of the playbook. With C(sqlite),
+        the state file is a SQLite database holding one row per resource,
+        which lets parallel playbooks update the state and tasks read only
+        the rows they need.
     requirements:
       - whitelisting in configuration.
 """
 
-import json
 from ansible.plugins.callback import CallbackBase
+from ansible_collections.pravic.pravic.plugins.plugin_utils.state import get_backend
 
 
 class CallbackModule(CallbackBase):
@@ -23,17 +32,22 @@ class CallbackModule(CallbackBase):
     def __init__(self, display=None, options=None):
         super(CallbackModule, self).__init__(display=display, options=options)
         self.state_file = None
+        self.state_backend = None
 
     def v2_runner_on_start(self, host, task):
         vm = task.get_variable_manager()
-        self.state_file = vm.get_vars(host=host, task=task).get("state_file")
+        task_vars = vm.get_vars(host=host, task=task)
+        self.state_file = task_vars.get("state_file")
+        self.state_backend = task_vars.get("state_backend")
 
     def v2_runner_on_ok(self, result):
-        try:
-            with open(self.state_file) as fp:
-                state = json.load(fp)
-        except Exception:
-            state = {}
-        state.update(result._result.get("resources", {}))
-        with open(self.state_file, "w") as fp:
-            json.dump(state, fp, indent=True)
+        changes = {name: value for name, value in result._result.get("resources", {}).items() if name != "changed"}
+        changes.update((name, None) for name in result._result.get("removed", []))
+        if not changes or not self.state_file:
+            return
+        get_backend(self.state_backend, self.state_file).update(changes)
+
+    def v2_playbook_on_stats(self, stats):
+        # leave an up to date state file to whoever reads it after the playbook
+        if self.state_file:
+            get_backend(self.state_backend, self.state_file).flush()
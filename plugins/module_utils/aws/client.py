@@ -1,15 +1,20 @@
 # Copyright: (c) 2023, Ansible Project
 # GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 
+import collections
+import concurrent.futures
 import functools
 import json
-from typing import Any, Dict, List
+import threading
+import time
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
 import traceback
 
 BOTO3_IMP_ERR = None
 try:
     import boto3.session
-    import botocore
+    from botocore.config import Config
+    from botocore.exceptions import BotoCoreError, ClientError
 
     HAS_BOTO3 = True
 except ImportError:
@@ -17,8 +22,10 @@ except ImportError:
     HAS_BOTO3 = False
 
 from ansible.module_utils.basic import missing_required_lib, to_native
+from ansible_collections.pravic.pravic.plugins.module_utils.cache import FileCache
 from ansible_collections.pravic.pravic.plugins.module_utils.resource import CloudClient
 from ansible_collections.pravic.pravic.plugins.module_utils.exception import CloudException
+from ansible_collections.pravic.pravic.plugins.module_utils.poller import Durations, Poller, Timeouts
 
 
 class JsonPatch(list):
@@ -26,11 +33,18 @@ class JsonPatch(list):
         return json.dumps(self)
 
 
-def op(operation: str, path: str, value: str) -> Dict:
+def op(operation: str, path: str, value: Any = None) -> Dict:
     path = "/{0}".format(path.lstrip("/"))
+    if operation == "remove":
+        return {"op": operation, "path": path}
     return {"op": operation, "path": path, "value": value}
 
 
+def pointer(parent: str, key: Any) -> str:
+    """Append key to a JSON pointer, escaping it as per RFC 6901."""
+    return "{0}/{1}".format(parent, str(key).replace("~", "~0").replace("/", "~1"))
+
+
 class Resource:
     def __init__(self, resource: Dict, resource_type: "ResourceType") -> None:
         self.resource_type = resource_type
@@ -56,80 +70,328 @@ class Resource:
         return self._resource
 
     @property
-    def read_only_properties(self) -> List[str]:
+    def read_only_properties(self) -> FrozenSet[str]:
         return self.resource_type.read_only_properties
 
 
-class ResourceType:
-    def __init__(self, schema: Dict) -> None:
-        self._schema = schema
+Path = Tuple[str, ...]
 
-    @property
-    def type_name(self) -> str:
-        return self._schema["typeName"]
 
-    @property
-    def identifier(self) -> str:
-        return self._property_name(self._schema["primaryIdentifier"][0])
+def schema_path(pointer: str) -> Path:
+    """Convert a schema pointer such as /properties/Tags/*/Key to ("Tags", "Key")."""
+    parts = pointer.split("/")
+    if parts[:2] == ["", "properties"]:
+        parts = parts[2:]
+    return tuple(p for p in parts if p and p != "*" and not p.isdigit())
 
-    @property
-    def read_only_properties(self) -> List[str]:
-        return [p.split("/")[-1] for p in self._schema["readOnlyProperties"]]
+
+class ResourceType:
+    """A resource type schema compiled into constant time lookups.
+
+    Property paths are tuples of property names where array levels are
+    skipped, so that /properties/Tags/*/Key becomes ("Tags", "Key"). Their
+    schemas are resolved on first use, since recursive definitions describe
+    an unbounded number of paths.
+    """
+
+    __slots__ = (
+        "_schema",
+        "type_name",
+        "primary_identifier",
+        "identifier",
+        "read_only_paths",
+        "write_only_paths",
+        "create_only_paths",
+        "read_only_properties",
+        "write_only_properties",
+        "create_only_properties",
+        "readable_properties",
+        "properties_index",
+        "listable",
+    )
+
+    def __init__(self, schema: Dict) -> None:
+        self._schema = schema
+        self.type_name: str = schema.get("typeName", "")
+        self.primary_identifier = tuple(schema_path(p) for p in schema.get("primaryIdentifier", []))
+        self.identifier: Optional[str] = self.primary_identifier[0][-1] if self.primary_identifier else None
+        self.read_only_paths = frozenset(schema_path(p) for p in schema.get("readOnlyProperties", []))
+        self.write_only_paths = frozenset(schema_path(p) for p in schema.get("writeOnlyProperties", []))
+        self.create_only_paths = frozenset(schema_path(p) for p in schema.get("createOnlyProperties", []))
+        self.read_only_properties = frozenset(p[0] for p in self.read_only_paths if len(p) == 1)
+        self.write_only_properties = frozenset(p[0] for p in self.write_only_paths if len(p) == 1)
+        self.create_only_properties = frozenset(p[0] for p in self.create_only_paths if len(p) == 1)
+        # properties every read of a resource reports
+        self.readable_properties = frozenset(schema.get("required", [])) | self.read_only_properties
+        if self.identifier:
+            self.readable_properties |= {self.identifier}
+        self.properties_index: Dict[Path, Dict] = {(): schema}
+        # some list handlers need properties of a parent resource to list anything
+        list_handler = schema.get("handlers", {}).get("list")
+        self.listable = isinstance(list_handler, dict) and not (list_handler.get("handlerSchema") or {}).get("required") and len(self.primary_identifier) == 1
 
     def make(self, resource: Dict) -> Resource:
         return Resource(resource, self)
 
-    def _property_name(self, path: str) -> str:
-        return path.split("/")[-1]
+    def is_complete(self, model: Dict, desired: Dict) -> bool:
+        """Return whether model looks like a full read of the resource: it holds
+        the required and read-only properties and every property set in desired."""
+        if not self.readable_properties <= model.keys():
+            return False
+        return all(key in model for key, value in desired.items() if value is not None and key not in self.write_only_properties)
+
+    def property_schema(self, path: Path) -> Dict:
+        try:
+            return self.properties_index[path]
+        except KeyError:
+            pass
+        node = self.property_schema(path[:-1])
+        # properties of array items are addressed without the array level
+        while isinstance(node.get("items"), dict):
+            node = self._resolve(node["items"])
+        child = (node.get("properties") or {}).get(path[-1])
+        node = self._resolve(child) if isinstance(child, dict) else {}
+        self.properties_index[path] = node
+        return node
+
+    def diff(self, existing: Dict, desired: Dict) -> JsonPatch:
+        """Return the minimal JSON patch bringing existing to desired.
+
+        Only the properties set in desired are compared, so that values
+        defaulted by the provider are left alone; a property explicitly set to
+        null is removed. Read-only and write-only properties are skipped and
+        arrays whose schema sets insertionOrder to false are compared as
+        multisets.
+        """
+        patch = JsonPatch()
+        self._diff_object((), "", existing, desired, patch)
+        return patch
+
+    def _diff_object(self, path: Path, ptr: str, existing: Dict, desired: Dict, patch: JsonPatch) -> None:
+        for key, value in desired.items():
+            child = path + (key,)
+            if child in self.read_only_paths or child in self.write_only_paths:
+                continue
+            if value is None:
+                if key in existing:
+                    patch.append(op("remove", pointer(ptr, key)))
+            elif key not in existing:
+                patch.append(op("add", pointer(ptr, key), value))
+            else:
+                self._diff_value(child, pointer(ptr, key), existing[key], value, patch)
+
+    def _diff_value(self, path: Path, ptr: str, existing: Any, desired: Any, patch: JsonPatch) -> None:
+        if existing == desired:
+            return
+        if isinstance(existing, dict) and isinstance(desired, dict):
+            self._diff_object(path, ptr, existing, desired, patch)
+        elif isinstance(existing, list) and isinstance(desired, list):
+            if self.property_schema(path).get("insertionOrder") is False:
+                if not self._same_items(path, existing, desired):
+                    patch.append(op("replace", ptr, desired))
+            elif len(existing) == len(desired):
+                for index, (old, new) in enumerate(zip(existing, desired)):
+                    self._diff_value(path, pointer(ptr, index), old, new, patch)
+            else:
+                patch.append(op("replace", ptr, desired))
+        else:
+            patch.append(op("replace", ptr, desired))
+
+    def _same_items(self, path: Path, existing: List, desired: List) -> bool:
+        if len(existing) != len(desired):
+            return False
+        canonical = functools.partial(json.dumps, sort_keys=True, default=str)
+        if sorted(map(canonical, existing)) == sorted(map(canonical, desired)):
+            return True
+        # existing items may hold extra read-only or defaulted keys, so pair
+        # every desired item with an existing item it does not differ from
+        remaining = list(existing)
+        for new in desired:
+            for index, old in enumerate(remaining):
+                item_patch = JsonPatch()
+                self._diff_value(path, "", old, new, item_patch)
+                if not item_patch:
+                    del remaining[index]
+                    break
+            else:
+                return False
+        return True
+
+    def _resolve(self, node: Dict) -> Dict:
+        ref = node.get("$ref")
+        if not isinstance(ref, str) or not ref.startswith("#/"):
+            return node
+        target: Any = self._schema
+        for key in ref[2:].split("/"):
+            target = target.get(key, {}) if isinstance(target, dict) else {}
+        return {**target, **{k: v for k, v in node.items() if k != "$ref"}}
 
 
 class Discoverer:
-    def __init__(self, session: Any) -> None:
+    def __init__(self, session: Any, cache: Optional[FileCache] = None) -> None:
         self.client = session.client("cloudformation")
+        self.region = session.region_name
+        self.cache = cache
+        self._types: Dict[str, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
 
-    @functools.cache  # pylint: disable=method-cache-max-size-none
     def get(self, type_name: str) -> ResourceType:
+        # single flight: concurrent callers wait for the first lookup of a type
+        with self._lock:
+            future = self._types.get(type_name)
+            owner = future is None
+            if future is None:
+                future = self._types[type_name] = concurrent.futures.Future()
+        if owner:
+            try:
+                future.set_result(ResourceType(self._describe(type_name)))
+            except Exception as e:
+                with self._lock:
+                    del self._types[type_name]
+                future.set_exception(e)
+        return future.result()
+
+    def prefetch(self, type_names: Set[str]) -> None:
+        """Fetch the schemas of type_names concurrently."""
+        if not type_names:
+            return
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(type_names), 16)) as executor:
+            for future in [executor.submit(self.get, type_name) for type_name in type_names]:
+                future.result()
+
+    def _describe(self, type_name: str) -> Dict:
+        key = [self.region, type_name]
+        if self.cache:
+            cached = self.cache.get(key)
+            if cached:
+                return cached["Schema"]
         try:
             result = self.client.describe_type(Type="RESOURCE", TypeName=type_name)
         except self.client.exceptions.TypeNotFoundException as e:
             raise CloudException("Invalid TypeName: {0}".format(to_native(e)))
-        return ResourceType(json.loads(result["Schema"]))
+        schema = json.loads(result["Schema"])
+        if self.cache:
+            self.cache.set(key, {"Arn": result.get("Arn"), "VersionId": result.get("DefaultVersionId"), "Schema": schema})
+        return schema
 
 
 class AwsClient(CloudClient):
-    def __init__(self, check_mode=False, **kwargs) -> None:
+    def __init__(
+        self,
+        check_mode=False,
+        limits: Optional[Dict] = None,
+        timeouts: Optional[Dict] = None,
+        schema_cache: Optional[Dict] = None,
+        bulk_read: bool = False,
+        **kwargs,
+    ) -> None:
         if not HAS_BOTO3:
             raise CloudException(missing_required_lib("boto3 and botocore"))
 
+        super().__init__(limits=limits)
         self.check_mode = check_mode
+        self.poller = Poller()
+        self.durations = Durations()
+        self.timeouts = Timeouts(timeouts)
+        self.bulk_read = bulk_read
+        self.listed: Dict[str, Dict[str, Dict]] = {}
         self.session = boto3.session.Session(**kwargs)
-        self.resources = Discoverer(self.session)
-        self.client = self.session.client("cloudcontrol")
+        schema_cache = dict(schema_cache or {})
+        cache = FileCache("schemas", **schema_cache) if schema_cache.pop("enabled", True) else None
+        self.resources = Discoverer(self.session, cache=cache)
+        # let botocore retry throttled calls instead of failing the whole run
+        self.client = self.session.client("cloudcontrol", config=Config(retries={"mode": "adaptive", "max_attempts": 10}))
+
+    def close(self) -> None:
+        self.poller.close()
+
+    def prefetch(self, desired_state: Dict, current_state: Dict) -> None:
+        counts = collections.Counter(resource["Type"] for resource in desired_state.values() if "Type" in resource)
+        self.resources.prefetch(set(counts))
+        self.listed = {}
+        if not self.bulk_read:
+            return
+        # listing a type only pays off when it replaces several reads
+        type_names = [t for t, count in counts.items() if count > 1 and self.resources.get(t).listable]
+        if type_names:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(type_names), 16)) as executor:
+                listed = dict(zip(type_names, executor.map(self._list_resources, type_names)))
+            self.listed = {type_name: models for type_name, models in listed.items() if models is not None}
+
+    def _list_resources(self, type_name: str) -> Optional[Dict[str, Dict]]:
+        """Return the models of type_name by identifier, or None when the type
+        cannot be listed, in which case its resources are read one by one."""
+        models = {}
+        params = {"TypeName": type_name}
+        while True:
+            self.limiter.request(type_name)
+            try:
+                page = self.client.list_resources(**params)
+            except (BotoCoreError, ClientError):
+                return None
+            for description in page["ResourceDescriptions"]:
+                models[description["Identifier"]] = json.loads(description["Properties"])
+            if not page.get("NextToken"):
+                return models
+            params["NextToken"] = page["NextToken"]
+
+    def _describe(self, resource: Resource) -> Optional[Resource]:
+        """Return the existing resource, or None when it does not exist.
+
+        Types listed during prefetch are looked up in the listing. List
+        handlers often report partial models, down to the primary identifier,
+        and diffing against them would report spurious updates, so such
+        resources are read again.
+        """
+        listed = self.listed.get(resource.type_name)
+        if listed is not None:
+            model = listed.get(resource.identifier)
+            if model is None:
+                return None
+            if resource.resource_type.is_complete(model, resource.properties):
+                return resource.resource_type.make(model)
+        try:
+            return self._get_resource(resource)
+        except self.client.exceptions.ResourceNotFoundException:
+            return None
 
     def present(self, resource: Dict) -> Dict:
         r_type = self.resources.get(resource["Type"])
         desired = r_type.make(resource["Properties"])
-        try:
-            existing = self._get_resource(desired)
-            result = self._update(existing, desired)
-        except self.client.exceptions.ResourceNotFoundException:
-            result = self._create(desired)
-        return result
+        existing = self._describe(desired)
+        if existing is None:
+            return self._create(desired)
+        return self._update(existing, desired)
 
     def absent(self, resource: Dict) -> Dict:
         r_type = self.resources.get(resource["Type"])
         desired = r_type.make(resource["Properties"])
-        try:
-            existing = self._get_resource(desired)
-            result = self._delete(existing)
-        except self.client.exceptions.ResourceNotFoundException:
-            result = self.make_result(False, Resource({}, r_type), "Skipped")
-        return result
-
-    def _get_resource(self, resource: Resource) -> Resource:
-        result = self.client.get_resource(TypeName=resource.type_name, Identifier=resource.identifier)
+        existing = self._describe(desired)
+        if existing is None:
+            return self.make_result(False, Resource({}, r_type), "Skipped")
+        return self._delete(existing)
+
+    def _get_resource(self, resource: Resource, identifier: Optional[str] = None) -> Resource:
+        self.limiter.request(resource.type_name)
+        result = self.client.get_resource(TypeName=resource.type_name, Identifier=identifier or resource.identifier)
         return resource.resource_type.make(json.loads(result["ResourceDescription"]["Properties"]))
 
+    def _read_back(self, event: Dict, resource: Resource) -> Resource:
+        """Return the model reported by a completed request, and only read
+        the resource again when the request did not report a usable model.
+
+        Create and update handlers often leave out read-only properties such
+        as Arn, which dependents may reference, so a model is only used as is
+        when it holds the identifier and every read-only property.
+        """
+        try:
+            model = json.loads(event["ResourceModel"])
+        except (KeyError, TypeError, ValueError):
+            model = None
+        if isinstance(model, dict) and resource.resource_type.identifier in model and resource.read_only_properties <= model.keys():
+            return resource.resource_type.make(model)
+        return self._get_resource(resource, event.get("Identifier"))
+
     @staticmethod
     def make_result(changed: bool, result: Resource, msg: str) -> Dict:
         return {"changed": changed, **result.resource, "msg": msg}
@@ -141,52 +403,74 @@ class AwsClient(CloudClient):
         if self.check_mode:
             result = resource
         else:
-            response = self.client.create_resource(
-                TypeName=resource.type_name,
-                DesiredState=json.dumps(resource.properties),
-            )
-            try:
-                self._wait(response["ProgressEvent"]["RequestToken"])
-            except botocore.exceptions.WaiterError as e:
-                raise CloudException(e.last_response["ProgressEvent"]["StatusMessage"])
-            result = self._get_resource(resource)
+            with self.limiter.mutation(resource.type_name):
+                response = self.client.create_resource(
+                    TypeName=resource.type_name,
+                    DesiredState=json.dumps(resource.properties),
+                )
+                event = self._wait(response["ProgressEvent"], resource.type_name)
+            result = self._read_back(event, resource)
         return self.make_result(changed, result, msg)
 
     def _update(self, existing: Resource, desired: Resource) -> Dict:
         msg = "Skipped"
         changed = False
-        patch = JsonPatch()
-        filtered = {k: v for k, v in desired.properties.items() if k not in desired.read_only_properties}
-        for k, v in filtered.items():
-            if k not in existing.properties:
-                patch.append(op("add", k, v))
-            elif v != existing.properties.get(k):
-                patch.append(op("replace", k, v))
+        result = existing
+        patch = desired.resource_type.diff(existing.properties, desired.properties)
         if patch:
             changed = True
             msg = "Updated"
             if not self.check_mode:
-                result = self.client.update_resource(
-                    TypeName=existing.type_name,
-                    Identifier=existing.identifier,
-                    PatchDocument=str(patch),
-                )
-                self._wait(result["ProgressEvent"]["RequestToken"])
-        return self.make_result(changed, self._get_resource(desired), msg)
+                with self.limiter.mutation(existing.type_name):
+                    response = self.client.update_resource(
+                        TypeName=existing.type_name,
+                        Identifier=existing.identifier,
+                        PatchDocument=str(patch),
+                    )
+                    event = self._wait(response["ProgressEvent"], existing.type_name)
+                result = self._read_back(event, existing)
+        return self.make_result(changed, result, msg)
 
     def _delete(self, resource: Resource) -> Dict:
         msg = "Deleted"
         changed = True
         if not self.check_mode:
-            result = self.client.delete_resource(TypeName=resource.type_name, Identifier=resource.identifier)
-            self._wait(result["ProgressEvent"]["RequestToken"])
+            with self.limiter.mutation(resource.type_name):
+                result = self.client.delete_resource(TypeName=resource.type_name, Identifier=resource.identifier)
+                self._wait(result["ProgressEvent"], resource.type_name)
         return self.make_result(changed, resource, msg)
 
-    def _wait(self, token: str) -> None:
-        self.client.get_waiter("resource_request_success").wait(
-            RequestToken=token,
-            WaiterConfig={
-                "Delay": 10,
-                "MaxAttempts": 30,
-            },
+    @staticmethod
+    def _check(event: Dict, type_name: str) -> bool:
+        if event["OperationStatus"] in ("FAILED", "CANCEL_COMPLETE"):
+            raise CloudException(event.get("StatusMessage") or "{0} request for {1} failed".format(event.get("Operation"), type_name))
+        return event["OperationStatus"] == "SUCCESS"
+
+    def _wait(self, event: Dict, type_name: str) -> Dict:
+        """Wait for a resource request to complete and return its last ProgressEvent.
+
+        All requests are polled by the shared poller. The first poll is
+        scheduled after the duration usually observed for the same type and
+        operation, then polls back off exponentially with jitter.
+        """
+        if self._check(event, type_name):
+            return event
+        start = time.monotonic()
+        token = event["RequestToken"]
+        key = (type_name, event.get("Operation"))
+        expected = self.durations.expected(key)
+
+        def poll():
+            self.limiter.request(type_name)
+            progress = self.client.get_resource_request_status(RequestToken=token)["ProgressEvent"]
+            return (True, progress) if self._check(progress, type_name) else (False, None)
+
+        future = self.poller.watch(
+            poll,
+            self.timeouts.get(type_name),
+            delay=expected * 0.8 if expected else None,
+            description="{0} request {1} on {2}".format(event.get("Operation"), token, type_name),
         )
+        event = future.result()
+        self.durations.record(key, time.monotonic() - start)
+        return event
@@ -1,29 +1,160 @@
+import concurrent.futures
+import functools
 import json
-from typing import Any, Dict, Tuple
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
 import uuid
 
 from ansible.module_utils.basic import to_native
 from ansible_collections.pravic.pravic.plugins.module_utils.azure.credentials import AzureCredentials
 
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    pass
+
 try:
     from msrestazure.tools import resource_id
     from msrestazure.azure_configuration import AzureConfiguration
     from msrest.service_client import ServiceClient
     from msrestazure.azure_exceptions import CloudError
-    from msrest.pipeline import ClientRawResponse
+    from msrest.exceptions import ClientException
+    from msrest.pipeline import ClientRawResponse, HTTPPolicy, Pipeline, SansIOHTTPPolicy
+    from msrest.pipeline.requests import PipelineRequestsHTTPSender, RequestsCredentialsPolicy, RequestsPatchSession
+    from msrest.universal_http.requests import RequestsHTTPSender
     from msrest.polling import LROPoller
     from msrestazure.polling.arm_polling import ARMPolling
 
 except ImportError:
-    pass
+    ServiceClient = RequestsHTTPSender = object  # type: ignore[misc,assignment]
+    ClientException = Exception  # type: ignore[misc,assignment]
 
 from ansible.module_utils.common.dict_transformations import dict_merge
-from ansible_collections.pravic.pravic.plugins.module_utils.resource import CloudClient
+from ansible_collections.pravic.pravic.plugins.module_utils.cache import FileCache
+from ansible_collections.pravic.pravic.plugins.module_utils.poller import Poller, Timeouts
+from ansible_collections.pravic.pravic.plugins.module_utils.resource import REREG, CloudClient, compile_refs, referenced
 from ansible_collections.pravic.pravic.plugins.module_utils.exception import CloudException
 
 
+class ConnectionPool:
+    """One requests session shared by every worker, with a connection pool
+    large enough to keep a connection alive per worker."""
+
+    def __init__(self, maxsize: int = 10, block: bool = False) -> None:
+        self.maxsize = maxsize
+        self.block = block
+        self._session: Optional["requests.Session"] = None
+        self._adapter: Optional["HTTPAdapter"] = None
+        self._retired = {"requests": 0, "connections": 0}
+        self._lock = threading.Lock()
+
+    def session(self, init: Optional[Callable[["requests.Session"], None]] = None) -> "requests.Session":
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                if init:
+                    init(session)
+                self._mount(session)
+                self._session = session
+            return self._session
+
+    def _mount(self, session: "requests.Session") -> None:
+        if self._adapter is not None:
+            for key, value in self._stats(self._adapter).items():
+                self._retired[key] += value
+        adapter = HTTPAdapter(pool_maxsize=self.maxsize, pool_block=self.block)
+        previous_adapters = set(session.adapters.values())
+        for prefix, previous in list(session.adapters.items()):
+            if isinstance(previous, HTTPAdapter):
+                adapter.max_retries = previous.max_retries
+            session.mount(prefix, adapter)
+        self._adapter = adapter
+        # connections still in use are closed when they are released
+        for previous in previous_adapters:
+            previous.close()
+
+    def resize(self, maxsize: int) -> None:
+        """Grow the pool to keep at least maxsize connections alive."""
+        with self._lock:
+            if maxsize <= self.maxsize:
+                return
+            self.maxsize = maxsize
+            if self._session is not None:
+                self._mount(self._session)
+
+    @staticmethod
+    def _stats(adapter: "HTTPAdapter") -> Dict[str, int]:
+        stats = {"requests": 0, "connections": 0}
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                stats["requests"] += pool.num_requests
+                stats["connections"] += pool.num_connections
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            if self._session is not None:
+                if self._adapter is not None:
+                    for key, value in self._stats(self._adapter).items():
+                        self._retired[key] += value
+                self._session.close()
+                self._session = self._adapter = None
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of requests sent and of connections opened to send them."""
+        with self._lock:
+            stats = dict(self._retired)
+            if self._adapter is not None:
+                for key, value in self._stats(self._adapter).items():
+                    stats[key] += value
+        stats["reused"] = stats["requests"] - stats["connections"]
+        return stats
+
+
+class PooledHTTPSender(RequestsHTTPSender):
+    """Send the requests of every thread through the session of a ConnectionPool.
+
+    RequestsHTTPSender keeps one session per thread, so every worker would
+    open its own connections.
+    """
+
+    def __init__(self, config: Any, pool: ConnectionPool) -> None:
+        self.pool = pool
+        super().__init__(config)
+
+    @property
+    def session(self) -> "requests.Session":
+        return self.pool.session(self._init_session)
+
+    @session.setter
+    def session(self, value: Any) -> None:
+        pass
+
+
+class PooledServiceClient(ServiceClient):
+    def __init__(self, creds: Any, config: Any, pool: ConnectionPool) -> None:
+        self.pool = pool
+        super().__init__(creds, config)
+        # otherwise the session, and its connections, is closed after every
+        # request that is not streamed
+        self.config.keep_alive = True
+
+    def _create_default_pipeline(self) -> Any:
+        # same policies as ServiceClient, with a pooled sender
+        creds = self.config.credentials
+        policies: List[Any] = [self.config.user_agent_policy, RequestsPatchSession(), self.config.http_logger_policy]
+        if isinstance(creds, (HTTPPolicy, SansIOHTTPPolicy)):
+            policies.insert(1, creds)
+        elif creds:
+            policies.insert(1, RequestsCredentialsPolicy(creds))
+        return Pipeline(policies, PipelineRequestsHTTPSender(PooledHTTPSender(self.config, self.pool)))
+
+
 class AzureRestClient(object):
-    def __init__(self, **kwargs):
+    def __init__(self, pool: Optional[Dict] = None, **kwargs):
         is_track2 = kwargs.pop("is_track2", None)
         user_agent = kwargs.pop("user_agent", None)
         self.azure_credentials = AzureCredentials(**kwargs)
@@ -45,7 +176,8 @@ class AzureRestClient(object):
         self._config = None
         self.user_agent = user_agent or "Ansible/Pravic"
 
-        self._client = ServiceClient(self.credentials, self.configuration)
+        self.pool = ConnectionPool(**(pool or {}))
+        self._client = PooledServiceClient(self.credentials, self.configuration, self.pool)
         self.models = None
 
     @property
@@ -57,7 +189,8 @@ class AzureRestClient(object):
 
     def query(self, url, method, query_parameters, header_parameters, body, expected_status_codes, polling_timeout, polling_interval):
         # Construct and send request
-        operation_config = {}
+        # read responses at once so that their connection goes back to the pool
+        operation_config = {"stream": False}
 
         request = None
 
@@ -102,10 +235,242 @@ class AzureRestClient(object):
         return poller.result()
 
 
+class ApiVersions:
+    """Resolve the latest api-version of resource types.
+
+    Providers are looked up once per subscription and namespace, concurrent
+    callers wait for the first lookup, and the result is kept in an optional
+    on-disk cache.
+    """
+
+    API_VERSION = "2015-01-01"
+
+    def __init__(self, client: AzureRestClient, cache: Optional[FileCache] = None) -> None:
+        self.client = client
+        self.cache = cache
+        self._providers: Dict[Tuple[str, str], concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, subscription: str, namespace: str, resource_type: str) -> str:
+        api_version = self._versions(subscription, namespace).get(resource_type.lower())
+        if not api_version:
+            raise CloudException("Couldn't find api version for {0}/{1}".format(namespace, resource_type))
+        return api_version
+
+    def _versions(self, subscription: str, namespace: str) -> Dict[str, str]:
+        # single flight: concurrent callers wait for the first lookup of a provider
+        key = (subscription, namespace.lower())
+        with self._lock:
+            future = self._providers.get(key)
+            owner = future is None
+            if future is None:
+                future = self._providers[key] = concurrent.futures.Future()
+        if owner:
+            try:
+                future.set_result(self._describe(subscription, namespace))
+            except Exception as e:
+                with self._lock:
+                    del self._providers[key]
+                future.set_exception(e)
+        return future.result()
+
+    def _describe(self, subscription: str, namespace: str) -> Dict[str, str]:
+        if self.cache:
+            cached = self.cache.get([subscription, namespace.lower()])
+            if cached:
+                return cached
+        url = "/subscriptions/{0}/providers/{1}".format(subscription, namespace)
+        provider = json.loads(self.client.query(url, "GET", {"api-version": self.API_VERSION}, None, None, [200], 0, 0).text)
+        return self._store(subscription, namespace, provider)
+
+    def _store(self, subscription: str, namespace: str, provider: Dict) -> Dict[str, str]:
+        versions = {rt["resourceType"].lower(): rt["apiVersions"][0] for rt in provider.get("resourceTypes", []) if rt.get("apiVersions")}
+        if self.cache:
+            self.cache.set([subscription, namespace.lower()], versions)
+        return versions
+
+    def _known(self, subscription: str, namespace: str) -> bool:
+        with self._lock:
+            if (subscription, namespace.lower()) in self._providers:
+                return True
+        return bool(self.cache and self.cache.get([subscription, namespace.lower()]))
+
+    def prewarm(self, subscription: str, namespaces: Iterable[str]) -> None:
+        """Resolve the providers of namespaces with a single listing of the subscription providers."""
+        namespaces = {namespace.lower() for namespace in namespaces}
+        url = "/subscriptions/{0}/providers".format(subscription)
+        query = {"api-version": self.API_VERSION}
+        while url:
+            page = json.loads(self.client.query(url, "GET", query, None, None, [200], 0, 0).text)
+            for provider in page.get("value", []):
+                namespace = provider.get("namespace", "")
+                if namespace.lower() not in namespaces:
+                    continue
+                future: concurrent.futures.Future = concurrent.futures.Future()
+                future.set_result(self._store(subscription, namespace, provider))
+                with self._lock:
+                    self._providers.setdefault((subscription, namespace.lower()), future)
+            # the next link already carries the query parameters
+            url, query = page.get("nextLink"), {}
+
+    def prefetch(self, keys: Set[Tuple[str, str]], prewarm: bool = False) -> None:
+        """Resolve the providers of (subscription, namespace) keys concurrently."""
+        # ARM namespaces are case insensitive
+        keys = set({(subscription, namespace.lower()): (subscription, namespace) for subscription, namespace in keys}.values())
+        if prewarm:
+            missing: Dict[str, Set[str]] = {}
+            for subscription, namespace in keys:
+                if not self._known(subscription, namespace):
+                    missing.setdefault(subscription, set()).add(namespace)
+            for subscription, namespaces in missing.items():
+                # one listing is only cheaper than several provider lookups
+                if len(namespaces) > 1:
+                    self.prewarm(subscription, namespaces)
+        if not keys:
+            return
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(keys), 16)) as executor:
+            for future in [executor.submit(self._versions, *key) for key in keys]:
+                future.result()
+
+
+def _retry_after(response: Any) -> Optional[float]:
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, TypeError, ValueError):
+        # missing, or an HTTP date which ARM does not send
+        return None
+
+
+def _provisioning_state(response: Any) -> Optional[str]:
+    try:
+        return json.loads(response.text)["properties"]["provisioningState"]
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
 class AzureClient(CloudClient):
-    def __init__(self, check_mode=False, **kwargs: Any) -> None:
+    # https://learn.microsoft.com/en-us/azure/azure-resource-manager/management/async-operations
+    FAILED_STATES = ("Failed", "Canceled")
+    TERMINAL_STATES = ("Succeeded",) + FAILED_STATES
+
+    # https://learn.microsoft.com/en-us/azure/azure-resource-manager/management/request-limits-and-throttling
+    BATCH_API_VERSION = "2020-06-01"
+    BATCH_SIZE = 20
+
+    # gateways, AKS clusters or SQL managed instances take tens of minutes
+    DEFAULT_TIMEOUT = 3600.0
+
+    def __init__(
+        self,
+        check_mode=False,
+        limits: Optional[Dict] = None,
+        timeouts: Optional[Dict] = None,
+        api_version_cache: Optional[Dict] = None,
+        batch_reads: bool = True,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(limits=limits)
         self.mgmt_client = AzureRestClient(**kwargs)
         self.check_mode = check_mode
+        self.poller = Poller()
+        self.timeouts = Timeouts(timeouts, default=self.DEFAULT_TIMEOUT)
+        api_version_cache = dict(api_version_cache or {})
+        self.prewarm = api_version_cache.pop("prewarm", False)
+        cache = FileCache("api_versions", **api_version_cache) if api_version_cache.pop("enabled", True) else None
+        self.api_versions = ApiVersions(self.mgmt_client, cache=cache)
+        self.batch_reads = batch_reads
+        self._pool_stats: Dict[str, int] = {}
+        # resources read by prefetch, keyed by (url, api-version)
+        self._snapshot: Dict[Tuple[str, str], Dict] = {}
+
+    def close(self) -> None:
+        self.poller.close()
+        self.mgmt_client.pool.close()
+
+    def metrics(self) -> Dict[str, Dict[str, int]]:
+        # counters of the pool since the previous run
+        stats = self.mgmt_client.pool.stats()
+        previous, self._pool_stats = self._pool_stats, stats
+        return {"connections": {key: value - previous.get(key, 0) for key, value in stats.items()}}
+
+    def set_concurrency(self, max_workers: int) -> None:
+        # the provider lookups of prefetch run on up to 16 threads
+        self.mgmt_client.pool.resize(max(max_workers, 16))
+
+    def prefetch(self, desired_state: Dict, current_state: Dict) -> None:
+        keys = set()
+        for resource in desired_state.values():
+            if resource.get("api-version") or not isinstance(resource.get("provider"), str):
+                continue
+            subscription = resource.get("subscriptionId") or self.mgmt_client.subscription_id
+            # references are only known once their target has been applied
+            if not REREG.search(str(subscription) + resource["provider"]):
+                keys.add((subscription, resource["provider"]))
+        self.api_versions.prefetch(keys, prewarm=self.prewarm)
+        self._snapshot = self._read_batches(desired_state) if self.batch_reads else {}
+
+    def _read_batches(self, desired_state: Dict) -> Dict[Tuple[str, str], Dict]:
+        """Read the resources of desired_state through ARM batch requests.
+
+        Only resources that do not depend on other resources of the run are
+        read, the others could be changed by their dependencies before they
+        are applied. Sub-requests that did not succeed or return 404 are left
+        out, and those resources are read again with a GET of their own.
+        """
+        reads: Dict[Tuple[str, str], str] = {}
+        for resource in desired_state.values():
+            if referenced(compile_refs(resource)) & desired_state.keys():
+                continue
+            try:
+                url = self._get_resource_url(resource)
+                if REREG.search(url + str(resource.get("api-version") or "")):
+                    continue
+                api_version = resource.get("api-version") or self._get_api_version(url)
+            except Exception:
+                continue
+            reads[(url, api_version)] = self._get_type_name(resource)
+        keys = list(reads)
+        # a single resource is as cheap to read on its own
+        if len(keys) < 2:
+            return {}
+        batches = []
+        for start in range(0, len(keys), self.BATCH_SIZE):
+            end = start + self.BATCH_SIZE
+            batches.append(keys[start:end])
+        snapshot: Dict[Tuple[str, str], Dict] = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(batches), 16)) as executor:
+            for future in [executor.submit(self._read_batch, batch, reads) for batch in batches]:
+                snapshot.update(future.result())
+        return snapshot
+
+    def _read_batch(self, keys: List[Tuple[str, str]], reads: Dict[Tuple[str, str], str]) -> Dict[Tuple[str, str], Dict]:
+        for key in keys:
+            self.limiter.request(reads[key])
+        body = {"requests": [{"name": str(i), "httpMethod": "GET", "url": "{0}?api-version={1}".format(*key)} for i, key in enumerate(keys)]}
+        try:
+            response = self._query_resource("POST", self.BATCH_API_VERSION, "/batch", body, status_code=[200])
+            responses = json.loads(response.text)["responses"]
+        except (ClientException, CloudException, KeyError, TypeError, ValueError):
+            # transport errors included, the resources are read one by one
+            return {}
+        snapshot = {}
+        for item in responses:
+            try:
+                key = keys[int(item["name"])]
+            except (KeyError, IndexError, TypeError, ValueError):
+                continue
+            if item.get("httpStatusCode") == 200 and isinstance(item.get("content"), dict):
+                snapshot[key] = item["content"]
+            elif item.get("httpStatusCode") == 404:
+                snapshot[key] = {}
+        return snapshot
+
+    @staticmethod
+    def _get_type_name(resource: Dict) -> str:
+        """Return the full resource type, e.g. Microsoft.Storage/storageAccounts/blobServices."""
+        types = [resource.get("provider"), resource.get("type")]
+        types.extend(item.get("type") for item in resource.get("subresource", []))
+        return "/".join(str(t) for t in types if t)
 
     def _get_resource_url(self, resource: Dict) -> str:
         params = {}
@@ -125,35 +490,34 @@ class AzureClient(CloudClient):
         return resource_id(**params)
 
     def _get_api_version(self, resource_url: str) -> str:
+        # if there's no provider in API version, assume Microsoft.Resources
+        if "/providers/" not in resource_url:
+            return "2018-05-01"
         try:
-            # extract provider and resource type
-            if "/providers/" in resource_url:
-                provider = resource_url.split("/providers/")[1].split("/")[0]
-                resourceType = resource_url.split(provider + "/")[1].split("/")[0]
-                url = "/subscriptions/" + self.mgmt_client.subscription_id + "/providers/" + provider
-                api_versions = json.loads(self.mgmt_client.query(url, "GET", {"api-version": "2015-01-01"}, None, None, [200], 0, 0).text)
-                for rt in api_versions["resourceTypes"]:
-                    if rt["resourceType"].lower() == resourceType.lower():
-                        api_version = rt["apiVersions"][0]
-                        break
-            else:
-                # if there's no provider in API version, assume Microsoft.Resources
-                api_version = "2018-05-01"
-            if not api_version:
-                self.fail("Couldn't find api version for {0}/{1}".format(provider, resourceType))
+            # extract subscription, provider and resource type
+            subscription = resource_url.split("/subscriptions/")[1].split("/")[0]
+            provider = resource_url.split("/providers/")[1].split("/")[0]
+            resourceType = resource_url.split(provider + "/")[1].split("/")[0]
+            return self.api_versions.get(subscription, provider, resourceType)
+        except CloudException:
+            raise
         except Exception as exc:
-            self.fail("Failed to obtain API version: {0}".format(str(exc)))
-
-        return api_version
+            raise CloudException("Failed to obtain API version: {0}".format(str(exc)))
 
     def _get_existing_resource(self, resource: Dict) -> Tuple[str, str, Dict]:
-        existing = {}
         url = self._get_resource_url(resource)
         api_version = resource.get("api-version")
         if not api_version:
             api_version = self._get_api_version(url)
 
+        # every resource is read once from the snapshot, later reads go to ARM
+        existing = self._snapshot.pop((url, api_version), None)
+        if existing is not None:
+            return (api_version, url, existing)
+
+        existing = {}
         qry_params = {"api-version": api_version}
+        self.limiter.request(self._get_type_name(resource))
         response = self.mgmt_client.query(url, "GET", qry_params, None, None, [200, 404], 0, 0)
 
         if response.status_code != 404:
@@ -162,8 +526,15 @@ class AzureClient(CloudClient):
         return (api_version, url, existing)
 
     def _query_resource(
-        self, method: Dict, api_version: str, resource_url: str, body: str, status_code: list[int] = None, polling_timeout: int = 0, polling_interval: int = 60
-    ) -> Dict:
+        self,
+        method: str,
+        api_version: str,
+        resource_url: str,
+        body: Any,
+        status_code: Optional[List[int]] = None,
+        polling_timeout: int = 0,
+        polling_interval: int = 60,
+    ) -> Any:
         qry = {"api-version": api_version}
         headers = {"Content-Type": "application/json; charset=utf-8"}
 
@@ -172,12 +543,70 @@ class AzureClient(CloudClient):
 
         return self.mgmt_client.query(resource_url, method, qry, headers, body, status_code, polling_timeout, polling_interval)
 
+    def _poll_operation(self, url: str, type_name: str) -> Tuple[bool, Optional[float]]:
+        self.limiter.request(type_name)
+        response = self.mgmt_client.query(url, "GET", {}, None, None, [200], 0, 0)
+        operation = json.loads(response.text)
+        status = operation.get("status")
+        if status in self.FAILED_STATES:
+            error = operation.get("error") or {}
+            raise CloudException("Operation on {0} {1}: {2}".format(type_name, status.lower(), error.get("message") or error.get("code")))
+        return status == "Succeeded", _retry_after(response)
+
+    def _poll_location(self, url: str, type_name: str) -> Tuple[bool, Optional[float]]:
+        self.limiter.request(type_name)
+        response = self.mgmt_client.query(url, "GET", {}, None, None, [200, 201, 202, 204], 0, 0)
+        return response.status_code != 202, _retry_after(response)
+
+    def _poll_resource(self, api_version: str, resource_url: str, type_name: str, deleting: bool) -> Tuple[bool, Optional[float]]:
+        self.limiter.request(type_name)
+        response = self._query_resource("GET", api_version, resource_url, None, status_code=[200, 404])
+        if response.status_code == 404:
+            return deleting, None
+        state = _provisioning_state(response)
+        if state in self.FAILED_STATES:
+            raise CloudException("Provisioning of {0} {1}".format(resource_url, state.lower()))
+        return not deleting and state in self.TERMINAL_STATES + (None,), _retry_after(response)
+
+    def _wait(self, response: Any, api_version: str, resource_url: str, type_name: str, deleting: bool = False) -> bool:
+        """Wait for the long running operation started by response, if any.
+
+        Operations are tracked through the Azure-AsyncOperation header, then
+        the Location header, then the provisioning state of the resource. All
+        of them are polled by the shared poller, as often as their
+        Retry-After header asks for. Return whether the resource has to be
+        read again.
+        """
+        async_url = response.headers.get("Azure-AsyncOperation")
+        location = response.headers.get("Location")
+        if async_url:
+            poll = functools.partial(self._poll_operation, async_url, type_name)
+        elif location and response.status_code == 202:
+            poll = functools.partial(self._poll_location, location, type_name)
+        elif response.status_code == 202 or (not deleting and _provisioning_state(response) not in self.TERMINAL_STATES + (None,)):
+            poll = functools.partial(self._poll_resource, api_version, resource_url, type_name, deleting)
+        else:
+            return False
+        future = self.poller.watch(
+            poll,
+            self.timeouts.get(type_name),
+            delay=_retry_after(response),
+            description="{0} of {1}".format("deletion" if deleting else "provisioning", resource_url),
+        )
+        future.result()
+        return True
+
     def present(self, resource: Dict) -> Dict:
         api_version, resource_url, existing = self._get_existing_resource(resource)
         body = resource.get("parameters", {})
         changed = not existing or (dict_merge(existing, body) != existing)
         if changed and not self.check_mode:
-            response = self._query_resource("PUT", api_version, resource_url, body, status_code=[201])
+            type_name = self._get_type_name(resource)
+            with self.limiter.mutation(type_name):
+                response = self._query_resource("PUT", api_version, resource_url, body, status_code=[200, 201, 202])
+                if self._wait(response, api_version, resource_url, type_name):
+                    self.limiter.request(type_name)
+                    response = self._query_resource("GET", api_version, resource_url, None, status_code=[200])
             try:
                 existing = json.loads(response.text)
             except Exception:
@@ -188,5 +617,8 @@ class AzureClient(CloudClient):
         api_version, resource_url, existing = self._get_existing_resource(resource)
         changed = bool(existing)
         if changed and not self.check_mode:
-            self._query_resource("DELETE", api_version, resource_url, {}, status_code=[204])
+            type_name = self._get_type_name(resource)
+            with self.limiter.mutation(type_name):
+                response = self._query_resource("DELETE", api_version, resource_url, {}, status_code=[200, 202, 204])
+                self._wait(response, api_version, resource_url, type_name, deleting=True)
         return {"changed": changed, **existing}
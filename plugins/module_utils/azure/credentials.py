@@ -1,5 +1,8 @@
 import os
+import hashlib
 import inspect
+import threading
+import time
 import traceback
 
 from os.path import expanduser
@@ -8,6 +11,7 @@ from ansible.module_utils.basic import missing_required_lib
 from ansible.module_utils.six.moves import configparser
 import ansible.module_utils.six.moves.urllib.parse as urlparse
 
+from ansible_collections.pravic.pravic.plugins.module_utils.cache import HAS_CRYPTOGRAPHY, EncryptedFileCache
 from ansible_collections.pravic.pravic.plugins.module_utils.exception import CloudException
 
 
@@ -42,9 +46,10 @@ try:
     from azure.mgmt.resource.subscriptions import SubscriptionClient
     from adal.authentication_context import AuthenticationContext
     from azure.identity._credentials import client_secret, user_password, certificate
+    from msrest.authentication import Authentication
 
 except ImportError:
-    Authentication = object
+    Authentication = object  # type: ignore[misc,assignment]
     HAS_AZURE_EXC = traceback.format_exc()
     HAS_AZURE = False
 
@@ -57,6 +62,85 @@ except ImportError:
     CLIError = Exception
 
 
+def _fingerprint(secret):
+    return hashlib.sha256(secret.encode()).hexdigest() if secret else None
+
+
+class TokenCache(object):
+    """Keep the bearer tokens of the AAD credentials between module runs.
+
+    Tokens are stored encrypted on disk and are only reused while they are
+    valid for more than ``MARGIN`` seconds, a new token is acquired otherwise.
+    """
+
+    MARGIN = 600
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def valid(self, token):
+        return token.get("expires_at", 0) - time.time() > self.MARGIN
+
+    def get(self, key):
+        token = self.cache.get(key)
+        if not isinstance(token, dict) or not self.valid(token):
+            return None
+        return token
+
+    def set(self, key, token):
+        try:
+            expires_at = float(token["expires_on"])
+        except (KeyError, TypeError, ValueError):
+            # ADAL reports expires_on as a date, the lifetime is enough
+            try:
+                expires_at = time.time() + float(token["expires_in"])
+            except (KeyError, TypeError, ValueError):
+                return
+        self.cache.set(key, {"access_token": token["access_token"], "token_type": token.get("token_type", "Bearer"), "expires_at": expires_at})
+
+    def credentials(self, key, acquire):
+        """Return credentials signing with a cached token, acquire() them on a miss."""
+        token = self.get(key)
+        if token is not None:
+            return CachedTokenCredentials(self, key, acquire, token)
+        return self.acquire(key, acquire)
+
+    def acquire(self, key, acquire):
+        credentials = acquire()
+        token = getattr(credentials, "token", None)
+        if isinstance(token, dict) and token.get("access_token"):
+            self.set(key, token)
+        return credentials
+
+
+class CachedTokenCredentials(Authentication):
+    """Sign requests with a cached token until it is about to expire.
+
+    The credentials are then acquired again, stored in the cache, and sign
+    the following requests, refreshing their token themselves.
+    """
+
+    def __init__(self, cache, key, acquire, token):
+        self.cache = cache
+        self.key = key
+        self.token = token
+        self.scheme = token.get("token_type") or "Bearer"
+        self._acquire = acquire
+        self._credentials = None
+        self._lock = threading.Lock()
+
+    def signed_session(self, session=None):
+        with self._lock:
+            if self._credentials is None and not self.cache.valid(self.token):
+                self._credentials = self.cache.acquire(self.key, self._acquire)
+        if self._credentials is not None:
+            return self._credentials.signed_session(session)
+        if session is None:
+            session = super(CachedTokenCredentials, self).signed_session()
+        session.headers["Authorization"] = "{0} {1}".format(self.scheme, self.token["access_token"])
+        return session
+
+
 class AzureCredentials(object):
     _cloud_environment = None
     _adfs_authority_url = None
@@ -78,8 +162,10 @@ class AzureCredentials(object):
         is_ad_resource=False,
         x509_certificate_path=None,
         thumbprint=None,
+        token_cache=None,
     ):
         self.is_ad_resource = is_ad_resource
+        self.token_cache = self._get_token_cache(token_cache)
 
         # authenticate
         self.credentials = self._get_credentials(
@@ -162,13 +248,24 @@ class AzureCredentials(object):
         elif self.credentials.get("client_id") is not None and self.credentials.get("secret") is not None and self.credentials.get("tenant") is not None:
             graph_resource = self._cloud_environment.endpoints.active_directory_graph_resource_id
             rm_resource = self._cloud_environment.endpoints.resource_manager
-            self.azure_credentials = ServicePrincipalCredentials(
-                client_id=self.credentials["client_id"],
-                secret=self.credentials["secret"],
-                tenant=self.credentials["tenant"],
-                cloud_environment=self._cloud_environment,
-                resource=graph_resource if self.is_ad_resource else rm_resource,
-                verify=self._cert_validation_mode == "validate",
+            resource = graph_resource if self.is_ad_resource else rm_resource
+            self.azure_credentials = self._cached_token(
+                [
+                    "client_secret",
+                    self._adfs_authority_url,
+                    self.credentials["tenant"],
+                    self.credentials["client_id"],
+                    resource,
+                    _fingerprint(self.credentials["secret"]),
+                ],
+                lambda: ServicePrincipalCredentials(
+                    client_id=self.credentials["client_id"],
+                    secret=self.credentials["secret"],
+                    tenant=self.credentials["tenant"],
+                    cloud_environment=self._cloud_environment,
+                    resource=resource,
+                    verify=self._cert_validation_mode == "validate",
+                ),
             )
             self.azure_credential_track2 = client_secret.ClientSecretCredential(
                 client_id=self.credentials["client_id"], client_secret=self.credentials["secret"], tenant_id=self.credentials["tenant"]
@@ -180,13 +277,24 @@ class AzureCredentials(object):
             and self.credentials.get("thumbprint") is not None
             and self.credentials.get("x509_certificate_path") is not None
         ):
-            self.azure_credentials = self.acquire_token_with_client_certificate(
-                self._adfs_authority_url,
-                self._cloud_environment.endpoints.active_directory_resource_id,
-                self.credentials["x509_certificate_path"],
-                self.credentials["thumbprint"],
-                self.credentials["client_id"],
-                self.credentials["tenant"],
+            resource = self._cloud_environment.endpoints.active_directory_resource_id
+            self.azure_credentials = self._cached_token(
+                [
+                    "client_certificate",
+                    self._adfs_authority_url,
+                    self.credentials["tenant"],
+                    self.credentials["client_id"],
+                    resource,
+                    self.credentials["thumbprint"],
+                ],
+                lambda: self.acquire_token_with_client_certificate(
+                    self._adfs_authority_url,
+                    resource,
+                    self.credentials["x509_certificate_path"],
+                    self.credentials["thumbprint"],
+                    self.credentials["client_id"],
+                    self.credentials["tenant"],
+                ),
             )
 
             self.azure_credential_track2 = certificate.CertificateCredential(
@@ -198,12 +306,22 @@ class AzureCredentials(object):
             if not tenant:
                 tenant = "common"  # SDK default
 
-            self.azure_credentials = UserPassCredentials(
-                self.credentials["ad_user"],
-                self.credentials["password"],
-                tenant=tenant,
-                cloud_environment=self._cloud_environment,
-                verify=self._cert_validation_mode == "validate",
+            self.azure_credentials = self._cached_token(
+                [
+                    "user_password",
+                    self._adfs_authority_url,
+                    tenant,
+                    self.credentials["ad_user"],
+                    self._cloud_environment.endpoints.resource_manager,
+                    _fingerprint(self.credentials["password"]),
+                ],
+                lambda: UserPassCredentials(
+                    self.credentials["ad_user"],
+                    self.credentials["password"],
+                    tenant=tenant,
+                    cloud_environment=self._cloud_environment,
+                    verify=self._cert_validation_mode == "validate",
+                ),
             )
 
             client_id = self.credentials.get("client_id", "04b07795-8ddb-461a-bbee-02f9e1bf7b46")
@@ -221,13 +339,25 @@ class AzureCredentials(object):
             and self.credentials.get("client_id") is not None
             and self.credentials.get("tenant") is not None
         ):
-            self.azure_credentials = self.acquire_token_with_username_password(
-                self._adfs_authority_url,
-                self._cloud_environment.endpoints.active_directory_resource_id,
-                self.credentials["ad_user"],
-                self.credentials["password"],
-                self.credentials["client_id"],
-                self.credentials["tenant"],
+            resource = self._cloud_environment.endpoints.active_directory_resource_id
+            self.azure_credentials = self._cached_token(
+                [
+                    "adfs_user_password",
+                    self._adfs_authority_url,
+                    self.credentials["tenant"],
+                    self.credentials["client_id"],
+                    self.credentials["ad_user"],
+                    resource,
+                    _fingerprint(self.credentials["password"]),
+                ],
+                lambda: self.acquire_token_with_username_password(
+                    self._adfs_authority_url,
+                    resource,
+                    self.credentials["ad_user"],
+                    self.credentials["password"],
+                    self.credentials["client_id"],
+                    self.credentials["tenant"],
+                ),
             )
 
         else:
@@ -242,6 +372,19 @@ class AzureCredentials(object):
     def fail(msg):
         raise CloudException(msg)
 
+    def _get_token_cache(self, options):
+        options = dict(options or {})
+        if not options.pop("enabled", False):
+            return None
+        if not HAS_CRYPTOGRAPHY:
+            self.fail(missing_required_lib("cryptography", reason="for the Azure token cache"))
+        return TokenCache(EncryptedFileCache("azure_tokens", **options))
+
+    def _cached_token(self, key, acquire):
+        if self.token_cache is None:
+            return acquire()
+        return self.token_cache.credentials(key, acquire)
+
     def _get_env(self, module_key, default=None):
         "Read envvar matching module parameter"
         return os.environ.get(AZURE_CREDENTIAL_ENV_MAPPING[module_key], default)
@@ -286,9 +429,15 @@ class AzureCredentials(object):
                 except Exception as exc:
                     self.fail("cloud_environment {0} could not be resolved: {1}".format(_cloud_environment, str(exc)), exception=traceback.format_exc())
 
-        credentials = MSIAuthentication(client_id=client_id, cloud_environment=cloud_environment)
+        credentials = self._cached_token(
+            ["msi", client_id, cloud_environment.endpoints.active_directory_resource_id],
+            lambda: MSIAuthentication(client_id=client_id, cloud_environment=cloud_environment),
+        )
         credential = MSIAuthenticationWrapper(client_id=client_id, cloud_environment=cloud_environment)
         subscription_id = subscription_id or self._get_env("subscription_id")
+        subscription_key = ["msi_subscription", client_id, cloud_environment.name]
+        if not subscription_id and self.token_cache is not None:
+            subscription_id = self.token_cache.cache.get(subscription_key)
         if not subscription_id:
             try:
                 # use the first subscription of the MSI
@@ -299,6 +448,8 @@ class AzureCredentials(object):
                 self.fail(
                     "Failed to get MSI token: {0}. " "Please check whether your machine enabled MSI or grant access to any subscription.".format(str(exc))
                 )
+            if self.token_cache is not None:
+                self.token_cache.cache.set(subscription_key, subscription_id)
         return {
             "credentials": credentials,
             "credential": credential,
@@ -0,0 +1,152 @@
+# Copyright: (c) 2023, Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+
+    HAS_CRYPTOGRAPHY = True
+except ImportError:
+    HAS_CRYPTOGRAPHY = False
+
+
+def default_cache_dir() -> str:
+    base = os.environ.get("PRAVIC_CACHE_DIR")
+    if not base:
+        base = os.path.join(os.environ.get("XDG_CACHE_HOME") or "~/.cache", "pravic")
+    return os.path.expanduser(base)
+
+
+def default_key_file() -> str:
+    return os.path.expanduser(os.path.join(os.environ.get("XDG_CONFIG_HOME") or "~/.config", "pravic", "cache.key"))
+
+
+class FileCache:
+    """Persist JSON serialisable values on disk, one file per key.
+
+    Entries expire ``ttl`` seconds after they have been written. When the
+    files of the cache grow over ``max_size`` bytes, the least recently used
+    entries are evicted. The cache is best effort: any I/O error is treated as
+    a cache miss.
+    """
+
+    VERSION = 1
+
+    def __init__(self, namespace: str, path: Optional[str] = None, ttl: float = 86400, max_size: int = 64 * 1024 * 1024) -> None:
+        self.path = os.path.join(os.path.expanduser(path) if path else default_cache_dir(), namespace)
+        self.ttl = ttl
+        self.max_size = max_size
+
+    @staticmethod
+    def _key(key: Any) -> str:
+        return json.dumps(key, sort_keys=True)
+
+    def _filename(self, key: str) -> str:
+        return os.path.join(self.path, hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+    def _encode(self, entry: Dict) -> bytes:
+        return json.dumps(entry).encode()
+
+    def _decode(self, data: bytes) -> Dict:
+        return json.loads(data)
+
+    def get(self, key: Any) -> Optional[Any]:
+        key = self._key(key)
+        filename = self._filename(key)
+        try:
+            with open(filename, "rb") as fp:
+                entry = self._decode(fp.read())
+        except (OSError, ValueError):
+            return None
+        if entry.get("version") != self.VERSION or entry.get("key") != key or time.time() - entry.get("created", 0) > self.ttl:
+            return None
+        try:
+            # the access time drives the eviction order
+            os.utime(filename)
+        except OSError:
+            pass
+        return entry["value"]
+
+    def set(self, key: Any, value: Any) -> None:
+        key = self._key(key)
+        entry = {"version": self.VERSION, "key": key, "created": time.time(), "value": value}
+        try:
+            os.makedirs(self.path, mode=0o700, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as fp:
+                    fp.write(self._encode(entry))
+                os.replace(tmp, self._filename(key))
+            except BaseException:
+                os.unlink(tmp)
+                raise
+            self._evict()
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        entries = []
+        with os.scandir(self.path) as it:
+            for item in it:
+                if item.name.endswith(".json"):
+                    stat = item.stat()
+                    entries.append((stat.st_mtime, stat.st_size, item.path))
+        size = sum(entry[1] for entry in entries)
+        for _mtime, item_size, filename in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.unlink(filename)
+            except OSError:
+                continue
+            size -= item_size
+
+
+class EncryptedFileCache(FileCache):
+    """FileCache encrypting its entries with Fernet.
+
+    The key is generated on first use and stored in ``key_file``, only
+    readable by its owner and kept out of the cache directory by default.
+    """
+
+    def __init__(self, namespace: str, path: Optional[str] = None, key_file: Optional[str] = None, **kwargs: Any) -> None:
+        super().__init__(namespace, path, **kwargs)
+        self.key_file = os.path.expanduser(key_file) if key_file else default_key_file()
+        self._fernet = Fernet(self._load_key())
+
+    def _load_key(self) -> bytes:
+        try:
+            with open(self.key_file, "rb") as fp:
+                return fp.read()
+        except FileNotFoundError:
+            pass
+        key = Fernet.generate_key()
+        directory = os.path.dirname(self.key_file)
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                fp.write(key)
+            # fails when a concurrent process created the key first
+            os.link(tmp, self.key_file)
+        except FileExistsError:
+            with open(self.key_file, "rb") as fp:
+                return fp.read()
+        finally:
+            os.unlink(tmp)
+        return key
+
+    def _encode(self, entry: Dict) -> bytes:
+        return self._fernet.encrypt(super()._encode(entry))
+
+    def _decode(self, data: bytes) -> Dict:
+        try:
+            return super()._decode(self._fernet.decrypt(data))
+        except InvalidToken:
+            raise ValueError("Cache entry encrypted with another key")
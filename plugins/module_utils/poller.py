@@ -0,0 +1,170 @@
+# Copyright: (c) 2023, Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import concurrent.futures
+import fnmatch
+import heapq
+import itertools
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from ansible_collections.pravic.pravic.plugins.module_utils.exception import CloudException
+
+
+class Backoff:
+    """Exponential backoff with jitter, starting at sub-second intervals."""
+
+    def __init__(self, initial: float = 0.25, maximum: float = 10.0, factor: float = 2.0) -> None:
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+
+    def delay(self, attempt: int) -> float:
+        cap = min(self.maximum, self.initial * self.factor**attempt)
+        # keep at least half of the delay so that polls are not fired in bursts
+        return random.uniform(cap / 2, cap)
+
+
+class Durations:
+    """Learn how long operations usually take, using an exponential moving average."""
+
+    def __init__(self, alpha: float = 0.3) -> None:
+        self.alpha = alpha
+        self._expected: Dict[Hashable, float] = {}
+        self._lock = threading.Lock()
+
+    def expected(self, key: Hashable) -> Optional[float]:
+        with self._lock:
+            return self._expected.get(key)
+
+    def record(self, key: Hashable, seconds: float) -> None:
+        with self._lock:
+            previous = self._expected.get(key)
+            if previous is None:
+                self._expected[key] = seconds
+            else:
+                self._expected[key] = previous + self.alpha * (seconds - previous)
+
+
+class Timeouts:
+    """Per resource type timeouts, keyed by shell-style patterns.
+
+    When several patterns match, the longest (most specific) one wins.
+    """
+
+    def __init__(self, timeouts: Optional[Dict[str, float]] = None, default: float = 300.0) -> None:
+        self.default = default
+        self._patterns = sorted((timeouts or {}).items(), key=lambda item: len(item[0]), reverse=True)
+
+    def get(self, type_name: str) -> float:
+        for pattern, timeout in self._patterns:
+            if fnmatch.fnmatchcase(type_name, pattern):
+                return float(timeout)
+        return self.default
+
+
+class _Operation:
+    __slots__ = ("poll", "deadline", "description", "future", "attempt")
+
+    def __init__(self, poll: Callable[[], Tuple[bool, Any]], deadline: float, description: str) -> None:
+        self.poll = poll
+        self.deadline = deadline
+        self.description = description
+        self.future: concurrent.futures.Future = concurrent.futures.Future()
+        self.attempt = 0
+
+
+class Poller:
+    """Schedule the polls of every in-flight long running operation from a single thread.
+
+    Operations are kept in a heap ordered by their next poll time, so the
+    outstanding operations are polled round-robin, each one only when it is
+    due, and callers simply wait on the future returned by :meth:`watch`.
+    Due polls run on a small pool of ``workers`` threads, so that slow or
+    hung calls do not hold back the other operations, and an operation goes
+    back to the heap once its poll returned.
+    """
+
+    def __init__(self, backoff: Optional[Backoff] = None, workers: int = 8) -> None:
+        self.backoff = backoff or Backoff()
+        self.workers = workers
+        self._heap: List[Tuple[float, int, _Operation]] = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+    def watch(
+        self, poll: Callable[[], Tuple[bool, Any]], timeout: float, delay: Optional[float] = None, description: str = "operation"
+    ) -> concurrent.futures.Future:
+        """Register an operation and return a future for its result.
+
+        ``poll`` returns a ``(done, value)`` tuple: when ``done`` is true,
+        ``value`` is the result of the operation, otherwise it is an optional
+        number of seconds to wait before the next poll. Exceptions raised by
+        ``poll`` are set on the future.
+        """
+        now = time.monotonic()
+        operation = _Operation(poll, now + timeout, description)
+        if delay is None:
+            delay = self.backoff.delay(0)
+        self._schedule(operation, now + delay)
+        return operation.future
+
+    def _schedule(self, operation: _Operation, due: float) -> None:
+        with self._condition:
+            heapq.heappush(self._heap, (min(due, operation.deadline), next(self._counter), operation))
+            if self._thread is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pravic-poll")
+                self._thread = threading.Thread(target=self._run, args=(self._executor,), name="pravic-poller", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def close(self) -> None:
+        """Stop the threads of the poller, the next watch starts new ones."""
+        with self._condition:
+            self._thread = self._executor = None
+            self._condition.notify_all()
+
+    def _next(self, executor: concurrent.futures.ThreadPoolExecutor) -> Optional[_Operation]:
+        with self._condition:
+            while True:
+                if executor is not self._executor:
+                    # closed
+                    return None
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                due = self._heap[0][0]
+                now = time.monotonic()
+                if due > now:
+                    self._condition.wait(due - now)
+                    continue
+                return heapq.heappop(self._heap)[-1]
+
+    def _run(self, executor: concurrent.futures.ThreadPoolExecutor) -> None:
+        while True:
+            operation = self._next(executor)
+            if operation is None:
+                executor.shutdown(wait=False)
+                return
+            executor.submit(self._poll, operation)
+
+    def _poll(self, operation: _Operation) -> None:
+        try:
+            done, value = operation.poll()
+        except Exception as e:  # pylint: disable=broad-except
+            operation.future.set_exception(e)
+            return
+        if done:
+            operation.future.set_result(value)
+            return
+        now = time.monotonic()
+        if now >= operation.deadline:
+            operation.future.set_exception(CloudException("Timed out waiting for {0}".format(operation.description)))
+            return
+        operation.attempt += 1
+        delay = value if value is not None else self.backoff.delay(operation.attempt)
+        self._schedule(operation, now + delay)
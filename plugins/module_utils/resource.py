@@ -2,24 +2,24 @@
 # GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 
 import concurrent.futures
+import contextlib
+import copy
+import fnmatch
 import functools
-import operator
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import random
 import re
+import threading
+import time
 from graphlib import TopologicalSorter, CycleError
-import traceback
 from abc import ABCMeta, abstractmethod
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, List, Optional, Set, Tuple
 
-PYYAML_IMP_ERR = None
-try:
-    import yaml
-
-    HAS_PYYAML = True
-except ImportError:
-    PYYAML_IMP_ERR = traceback.format_exc()
-    HAS_PYYAML = False
-
-from ansible.module_utils.basic import missing_required_lib
+from ansible_collections.pravic.pravic.plugins.module_utils.exception import CloudException
 
 REREG = re.compile(r"resource:((\w+)\S+)")
 
@@ -55,6 +55,88 @@ def resolve_refs(node, context, check_mode):
     return node
 
 
+# path of a string within a resource, and the (start, end, target path) of
+# every reference it holds
+Reference = Tuple[Tuple[Any, ...], List[Tuple[int, int, List[str]]]]
+
+
+def compile_refs(node: Any) -> List[Reference]:
+    """Walk a resource once and record where its references are."""
+    refs: List[Reference] = []
+    stack: List[Tuple[Tuple[Any, ...], Any]] = [((), node)]
+    while stack:
+        path, value = stack.pop()
+        if isinstance(value, dict):
+            stack.extend((path + (k,), v) for k, v in value.items())
+        elif isinstance(value, list):
+            stack.extend((path + (i,), v) for i, v in enumerate(value))
+        elif isinstance(value, str):
+            matches = [(m.start(), m.end(), m.group(1).split(".")) for m in REREG.finditer(value)]
+            if matches:
+                refs.append((path, matches))
+    return refs
+
+
+def referenced(refs: List[Reference]) -> Set[str]:
+    """Return the names of the resources referenced by compiled refs."""
+    return {target[0] for _path, matches in refs for _start, _end, target in matches}
+
+
+def state_keys(desired_state: Dict) -> Set[str]:
+    """Return the names of the stored resources needed to apply desired_state.
+
+    That is the resources themselves and the resources they reference.
+    """
+    names = set(desired_state)
+    for resource in desired_state.values():
+        names |= referenced(compile_refs(resource))
+    return names
+
+
+def _substitute(value: str, matches: List[Tuple[int, int, List[str]]], context: Dict) -> str:
+    parts = []
+    position = 0
+    for start, end, target in matches:
+        parts.append(value[position:start])
+        parts.append(get_value(context, list(target)))
+        position = end
+    parts.append(value[position:])
+    return "".join(parts)
+
+
+def apply_refs(node: Any, refs: List[Reference], context: Dict, check_mode: bool) -> Any:
+    """Resolve compiled refs of node against context.
+
+    Only the containers holding a reference are copied, the rest of the
+    resolved node is shared with the original one.
+    """
+    if not refs:
+        return node
+    resolved = copy.copy(node)
+    copied = {()}
+    for path, matches in refs:
+        if not path:
+            return resolve_refs(node, context, check_mode)
+        parent = resolved
+        for depth in range(1, len(path)):
+            if path[:depth] not in copied:
+                parent[path[depth - 1]] = copy.copy(parent[path[depth - 1]])
+                copied.add(path[:depth])
+            parent = parent[path[depth - 1]]
+        value = parent[path[-1]]
+        try:
+            parent[path[-1]] = _substitute(value, matches, context)
+        except KeyError:
+            if not check_mode:
+                raise
+    return resolved
+
+
+def fingerprint(node: Any) -> str:
+    """Return a stable hash of a resolved resource definition."""
+    return hashlib.sha256(json.dumps(node, sort_keys=True, default=str).encode()).hexdigest()
+
+
 class ResourceExceptionError(Exception):
     def __init__(self, exc, msg):
         self.exc = exc
@@ -62,9 +144,72 @@ class ResourceExceptionError(Exception):
         super().__init__(self.msg)
 
 
+class TokenBucket:
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        self.rate = float(rate)
+        self.capacity = float(burst or max(self.rate, 1.0))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+class RateLimiter:
+    """Throttle the requests sent to a cloud provider.
+
+    ``limits`` maps shell-style patterns of resource types (for example
+    ``AWS::EC2::*``) to a dict with the optional keys ``rate`` (requests per
+    second), ``burst`` (bucket size) and ``concurrency`` (mutations in
+    flight). Every matching pattern applies, so ``*`` is a provider-wide limit.
+    """
+
+    KEYS = frozenset(("rate", "burst", "concurrency"))
+
+    def __init__(self, limits: Optional[Dict] = None) -> None:
+        self.rules: List[Tuple[str, Optional[TokenBucket], Optional[threading.Semaphore]]] = []
+        for pattern, limit in sorted((limits or {}).items()):
+            if not isinstance(limit, dict) or not set(limit) <= self.KEYS:
+                raise CloudException("Invalid limits for {0}, supported keys are {1}".format(pattern, ", ".join(sorted(self.KEYS))))
+            bucket = TokenBucket(limit["rate"], limit.get("burst")) if limit.get("rate") else None
+            semaphore = threading.BoundedSemaphore(limit["concurrency"]) if limit.get("concurrency") else None
+            self.rules.append((pattern, bucket, semaphore))
+
+    @functools.cache  # pylint: disable=method-cache-max-size-none
+    def _matching(self, type_name: str) -> List[Tuple[str, Optional[TokenBucket], Optional[threading.Semaphore]]]:
+        return [rule for rule in self.rules if fnmatch.fnmatchcase(type_name, rule[0])]
+
+    def request(self, type_name: str) -> None:
+        """Block until every bucket matching type_name grants a token."""
+        for _pattern, bucket, _semaphore in self._matching(type_name):
+            if bucket:
+                bucket.acquire()
+
+    @contextlib.contextmanager
+    def mutation(self, type_name: str) -> Iterator[None]:
+        """Hold a concurrency slot of every matching rule while mutating a resource."""
+        # rules are sorted, so slots are always taken in the same order
+        semaphores = [semaphore for _pattern, _bucket, semaphore in self._matching(type_name) if semaphore]
+        with contextlib.ExitStack() as stack:
+            for semaphore in semaphores:
+                stack.enter_context(semaphore)
+            self.request(type_name)
+            yield
+
+
 class CloudClient(metaclass=ABCMeta):
-    def __init__(self, **kwargs: Any) -> None:
-        pass
+    def __init__(self, limits: Optional[Dict] = None, **kwargs: Any) -> None:
+        self.limiter = RateLimiter(limits)
 
     @abstractmethod
     def present(self, resource: Dict) -> Dict:
@@ -74,50 +219,208 @@ class CloudClient(metaclass=ABCMeta):
     def absent(self, resource: Dict) -> Dict:
         pass
 
+    def prefetch(self, desired_state: Dict, current_state: Dict) -> None:
+        """Load whatever the resources of desired_state need before they are scheduled."""
+
+    def set_concurrency(self, max_workers: int) -> None:
+        """Size whatever the workers of a run share, called before prefetch."""
+
+    def close(self) -> None:
+        """Release the threads and connections kept between runs."""
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return counters about the last run, reported in the task result."""
+        return {}
+
     @staticmethod
-    def has_pyyaml() -> None:
-        if not HAS_PYYAML:
-            raise ResourceExceptionError(msg=missing_required_lib("PyYAML"), exc=PYYAML_IMP_ERR)
+    def compile_resources(desired_state: Dict) -> Dict[str, List[Reference]]:
+        return {name: compile_refs(resource) for name, resource in desired_state.items()}
 
-    def sort_resources(self, desired_state: Dict, state: str) -> TopologicalSorter:
-        sorter: TopologicalSorter = TopologicalSorter()
-        for name, resource in desired_state.items():
+    def dependency_graph(self, desired_state: Dict, state: str, compiled: Optional[Dict[str, List[Reference]]] = None) -> Dict[str, Set[str]]:
+        """Map every node to the set of nodes that must be processed before it."""
+        if compiled is None:
+            compiled = self.compile_resources(desired_state)
+        graph: Dict[str, Set[str]] = {}
+        for name in desired_state:
+            refs = referenced(compiled[name])
             if state == "present":
-                sorter.add(name, *map(operator.itemgetter(1), REREG.findall(yaml.dump(resource))))
+                graph.setdefault(name, set()).update(refs)
             elif state == "absent":
-                sorter.add(name)
-                for item in map(operator.itemgetter(1), REREG.findall(yaml.dump(resource))):
-                    sorter.add(item, name)
+                graph.setdefault(name, set())
+                for item in refs:
+                    graph.setdefault(item, set()).add(name)
+        return graph
 
+    @staticmethod
+    def _prepare(graph: Dict[str, Set[str]]) -> TopologicalSorter:
+        sorter: TopologicalSorter = TopologicalSorter(graph)
         try:
             sorter.prepare()
         except CycleError as err:
             raise ResourceExceptionError(msg="nodes are in circle", exc=err)
-
         return sorter
 
-    def run(self, desired_state, current_state, state, check_mode):
-        self.has_pyyaml()
-        sorter = self.sort_resources(desired_state, state)
-
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            current_state["changed"] = False
-            while sorter:
-                futures = {}
-                for name in sorter.get_ready():
-                    if state == "present":
-                        node = resolve_refs(desired_state[name], current_state, check_mode)
-                        futures[executor.submit(self.present, node)] = name
-                    elif state == "absent":
-                        if name not in current_state:
+    def sort_resources(self, desired_state: Dict, state: str) -> TopologicalSorter:
+        return self._prepare(self.dependency_graph(desired_state, state))
+
+    @staticmethod
+    def closure(graph: Dict[str, Set[str]], names: Set[str]) -> Set[str]:
+        """Return names and every node that must be processed before them."""
+        seen: Set[str] = set()
+        stack = list(names)
+        while stack:
+            name = stack.pop()
+            if name not in seen:
+                seen.add(name)
+                stack.extend(graph.get(name, ()))
+        return seen
+
+    @staticmethod
+    def subgraph(graph: Dict[str, Set[str]], names: Set[str]) -> Dict[str, Set[str]]:
+        return {name: deps & names for name, deps in graph.items() if name in names}
+
+    @staticmethod
+    def critical_path(graph: Dict[str, Set[str]]) -> Dict[str, int]:
+        """Return, for every node, the length of the longest chain of nodes
+        that cannot start before it (the node included)."""
+        successors: Dict[str, Set[str]] = {}
+        for node, deps in graph.items():
+            for dep in deps:
+                successors.setdefault(dep, set()).add(node)
+        lengths: Dict[str, int] = {}
+        for node in reversed(list(TopologicalSorter(graph).static_order())):
+            lengths[node] = 1 + max((lengths[s] for s in successors.get(node, ())), default=0)
+        return lengths
+
+    @staticmethod
+    def _trusted(previous: Any, digest: str) -> bool:
+        return isinstance(previous, dict) and previous.get("fingerprint") == digest
+
+    @staticmethod
+    def _skipped(previous: Dict) -> Dict:
+        result = dict(previous, changed=False)
+        if "msg" in result:
+            result["msg"] = "Skipped"
+        return result
+
+    def plan(self, desired_state: Dict, current_state: Dict, graph: Dict[str, Set[str]], compiled: Dict[str, List[Reference]], drift: Set[str]) -> Set[str]:
+        """Return the nodes to schedule: the nodes whose definition changed since
+        it was last applied, the nodes in drift, and all their dependents.
+
+        A node whose dependencies are all unchanged resolves against
+        current_state exactly as it would during the run, so its fingerprint
+        can be checked before anything is scheduled.
+        """
+        scheduled: Set[str] = set()
+        for name in TopologicalSorter(graph).static_order():
+            if name in drift or name not in desired_state or graph[name] & scheduled:
+                scheduled.add(name)
+                continue
+            try:
+                node = apply_refs(desired_state[name], compiled[name], current_state, False)
+            except (KeyError, IndexError, TypeError):
+                scheduled.add(name)
+                continue
+            if not self._trusted(current_state.get(name), fingerprint(node)):
+                scheduled.add(name)
+        return scheduled
+
+    def run(
+        self,
+        desired_state,
+        current_state,
+        state,
+        check_mode,
+        max_workers: Optional[int] = None,
+        trust_state: bool = False,
+        drift_check_ratio: float = 0.0,
+        targets: Optional[List[str]] = None,
+    ):
+        """Apply desired_state and return current_state updated with the results.
+
+        With trust_state, the fingerprint of every resolved definition is
+        stored with its result, and only the resources whose definition changed
+        since it was applied, their dependents and a random drift_check_ratio
+        share of the others are scheduled. Resources left out are reported
+        from current_state.
+
+        With targets, only the named resources are processed, along with
+        their dependencies when state is present, or the resources depending
+        on them when state is absent. Other resources are left untouched.
+        """
+        if max_workers is not None and max_workers < 1:
+            raise CloudException("max_workers must be at least 1, got {0}".format(max_workers))
+        if not 0.0 <= drift_check_ratio <= 1.0:
+            raise CloudException("drift_check_ratio must be between 0.0 and 1.0, got {0}".format(drift_check_ratio))
+        compiled = self.compile_resources(desired_state)
+        graph = self.dependency_graph(desired_state, state, compiled)
+        sorter = self._prepare(graph)
+        if targets:
+            unknown = set(targets) - desired_state.keys()
+            if unknown:
+                raise CloudException("Unknown targets: {0}".format(", ".join(sorted(unknown))))
+            # the graph is in execution order, so the nodes to process before
+            # a target are its dependencies, or its dependents when deleting
+            graph = self.subgraph(graph, self.closure(graph, set(targets)))
+            sorter = self._prepare(graph)
+        trusting = trust_state and state == "present" and not check_mode
+        drift: Set[str] = set()
+        if trusting:
+            drift = {name for name in desired_state if random.random() < drift_check_ratio}
+            scheduled = self.plan(desired_state, current_state, graph, compiled, drift)
+            for name in (graph.keys() & desired_state.keys()) - scheduled:
+                current_state[name] = self._skipped(current_state[name])
+            graph = self.subgraph(graph, scheduled)
+            sorter = self._prepare(graph)
+        priority = self.critical_path(graph)
+        # same default as concurrent.futures.ThreadPoolExecutor
+        max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.set_concurrency(max_workers)
+        self.prefetch({name: desired_state[name] for name in graph if name in desired_state}, current_state)
+        handler = self.present if state == "present" else self.absent
+
+        current_state["changed"] = False
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures: Dict[concurrent.futures.Future, str] = {}
+            fingerprints: Dict[str, str] = {}
+            ready: list = []
+            counter = itertools.count()
+            while sorter.is_active():
+                # nodes marked done without running unblock their dependents
+                # at once, so collect and dispatch until nothing else is ready
+                # before waiting on the running nodes
+                progressed = True
+                while progressed:
+                    progressed = False
+                    for name in sorter.get_ready():
+                        if state == "absent" and name not in current_state:
                             sorter.done(name)
+                            progressed = True
                             continue
-                        node = resolve_refs(desired_state[name], current_state, check_mode)
-                        futures[executor.submit(self.absent, node)] = name
-                for future in concurrent.futures.as_completed(futures):
+                        heapq.heappush(ready, (-priority[name], next(counter), name))
+                    # only hand over as many nodes as there are workers, so that
+                    # the longest chains are started first when concurrency is capped
+                    while ready and len(futures) < max_workers:
+                        name = heapq.heappop(ready)[-1]
+                        node = apply_refs(desired_state[name], compiled.get(name, []), current_state, check_mode)
+                        if trusting:
+                            fingerprints[name] = fingerprint(node)
+                            # dependents of changed nodes may still resolve as before
+                            if name not in drift and self._trusted(current_state.get(name), fingerprints[name]):
+                                current_state[name] = self._skipped(current_state[name])
+                                sorter.done(name)
+                                progressed = True
+                                continue
+                        futures[executor.submit(handler, node)] = name
+                if not futures:
+                    continue
+                finished, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    name = futures.pop(future)
                     result = future.result()
-                    name = futures[future]
                     if result:
+                        if name in fingerprints:
+                            result["fingerprint"] = fingerprints[name]
                         current_state[name] = result
                         current_state["changed"] |= result["changed"]
                     else:
@@ -0,0 +1,51 @@
+# Copyright: (c) 2023, Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from typing import Any, Dict
+
+from ansible_collections.pravic.pravic.plugins.module_utils.aws.client import AwsClient
+from ansible_collections.pravic.pravic.plugins.module_utils.azure.client import AzureClient
+from ansible_collections.pravic.pravic.plugins.module_utils.resource import CloudClient
+
+
+ARG_SPEC = {
+    "resources": {"type": "dict", "required": True},
+    "state": {"type": "str", "choices": ["present", "absent"], "default": "present"},
+    "current_state": {"type": "dict"},
+    "connection": {"type": "dict"},
+    "client": {"type": "str", "choices": ["aws", "azure"], "required": True},
+    "max_workers": {"type": "int"},
+    "targets": {"type": "list", "elements": "str"},
+    "trust_state": {"type": "bool", "default": False},
+    "drift_check_ratio": {"type": "float", "default": 0.0},
+    "execution": {"type": "str", "choices": ["module", "controller", "daemon"], "default": "module"},
+}
+
+CLIENT_MAPPING = {
+    "aws": AwsClient,
+    "azure": AzureClient,
+}
+
+
+def make_client(params: Dict[str, Any], check_mode: bool) -> CloudClient:
+    client_obj = CLIENT_MAPPING[params["client"]]
+    return client_obj(check_mode=check_mode, **params.get("connection") or {})
+
+
+def run_client(client: CloudClient, params: Dict[str, Any], check_mode: bool) -> Dict[str, Any]:
+    """Apply the validated task parameters and return the task result."""
+    result = client.run(
+        params.get("resources") or {},
+        params.get("current_state") or {},
+        params["state"],
+        check_mode,
+        max_workers=params.get("max_workers"),
+        trust_state=params["trust_state"],
+        drift_check_ratio=params["drift_check_ratio"],
+        targets=params.get("targets"),
+    )
+    output = {"changed": result["changed"], "resources": result}
+    metrics = client.metrics()
+    if metrics:
+        output["metrics"] = metrics
+    return output
@@ -37,6 +37,52 @@ options:
   connection:
     description:
       - parameters used to create cloud client.
+      - The C(limits) key throttles the requests sent to the provider. It maps
+        shell-style patterns of resource types, for example C(AWS::EC2::*) or
+        C(Microsoft.Storage/*), to a dict with the optional keys C(rate)
+        (requests per second), C(burst) (token bucket size) and C(concurrency)
+        (maximum number of mutations in flight). Every matching pattern
+        applies, so the pattern C(*) limits the whole provider. Polls of the
+        status of create, update and delete requests count as requests.
+      - The C(timeouts) key maps shell-style patterns of resource types to the
+        number of seconds to wait for a create, update or delete request to
+        complete. The most specific matching pattern wins, the default is 300
+        for AWS and 3600 for Azure, where gateways, AKS clusters or SQL
+        managed instances take tens of minutes to provision. Azure long
+        running operations are polled as often as their C(Retry-After) header
+        asks for.
+      - The C(schema_cache) key configures the on-disk cache of AWS resource
+        type schemas with the optional keys C(enabled) (default C(true)),
+        C(path) (default C(~/.cache/pravic) or the E(PRAVIC_CACHE_DIR)
+        environment variable), C(ttl) in seconds (default one day) and
+        C(max_size) in bytes (default 64MiB).
+      - When the C(bulk_read) key is C(true), AWS resource types declared more
+        than once are listed with a few paginated ListResources calls instead
+        of one GetResource call per resource. Types whose list handler needs
+        parent properties, types failing to list, and listed models missing
+        properties are read with GetResource.
+      - The C(api_version_cache) key configures how Azure resources without an
+        C(api-version) get the latest version of their type. Providers are
+        looked up once per subscription and namespace and kept in an on-disk
+        cache, with the optional keys C(enabled), C(path), C(ttl) and
+        C(max_size) of C(schema_cache). When C(prewarm) is C(true), the
+        providers of a run are resolved with a single listing of the
+        subscription providers.
+      - The C(pool) key configures the HTTP connections to Azure, shared by
+        all workers, with the optional keys C(maxsize), the number of
+        connections kept alive, at least O(max_workers), and C(block) to wait
+        for a free connection instead of opening more.
+      - The C(token_cache) key keeps the Azure AD tokens between tasks, in
+        files encrypted with a key generated on first use. It is disabled
+        unless C(enabled) is C(true) and requires the C(cryptography) Python
+        library, with the optional keys C(path), C(ttl) and C(max_size) of
+        C(schema_cache) and C(key_file), the file holding the key, by default
+        C(~/.config/pravic/cache.key). Tokens are refreshed ten minutes
+        before they expire.
+      - The C(batch_reads) key, C(true) by default, reads the Azure resources
+        that do not depend on other resources of the run through ARM batch
+        requests of up to 20 resources before they are processed. Set it to
+        C(false) to read every resource with a request of its own.
     type: dict
   client:
     description:
@@ -46,6 +92,62 @@ options:
       - aws
     type: str
     required: true
+  max_workers:
+    description:
+      - Maximum number of resources processed concurrently.
+      - When fewer workers than ready resources are available, the resources
+        with the longest chain of dependents are started first.
+      - Defaults to the number of processors plus four, capped at 32. Must be
+        at least 1.
+    type: int
+  trust_state:
+    description:
+      - Trust the stored state for resources whose definition did not change.
+      - When enabled, a fingerprint of every applied resource definition is
+        stored in the state. Only the resources whose fingerprint differs from
+        their stored state, and the resources depending on them, are
+        scheduled. The other resources are reported from the stored state
+        without any call to the provider.
+      - Only applies to O(state=present).
+    type: bool
+    default: false
+  targets:
+    description:
+      - Names of the resources to process.
+      - With O(state=present), the resources they depend on are processed as
+        well. With O(state=absent), the resources depending on them are
+        deleted first.
+      - The other resources are left untouched.
+      - All resources are processed when not set.
+    type: list
+    elements: str
+  drift_check_ratio:
+    description:
+      - Share of the resources skipped because of O(trust_state) that are
+        still checked against the provider to detect drift, between C(0) and
+        C(1).
+    type: float
+    default: 0
+  execution:
+    description:
+      - Where the resources are processed.
+      - With C(module), every task runs the module in a new Python process.
+      - With C(controller), the task runs in the action plugin on the
+        controller, without packaging and starting the module.
+      - With C(daemon), the task is handed over to a worker daemon running on
+        the controller, started on first use and reached through a Unix
+        socket. The daemon keeps the cloud clients, sessions, resource type
+        schemas and HTTP connections warm across tasks and playbook runs,
+        and exits after ten minutes without requests.
+      - With C(controller) and C(daemon), the C(environment) keyword does not
+        apply and the daemon only sees the environment of the controller when
+        it was started, pass credentials with O(connection) instead.
+    type: str
+    choices:
+      - module
+      - controller
+      - daemon
+    default: module
 
 requirements:
   - "python >= 3.9"
@@ -91,41 +193,37 @@ resources:
   type: list
   elements: dict
   sample: []
+removed:
+  description:
+    - Names of the task resources that were in the stored state and are no
+      longer part of it, the C(pravic.pravic.state) callback removes them from
+      the state file.
+    - Set by the action plugin.
+  returned: success
+  type: list
+  elements: str
+  sample: []
+metrics:
+  description:
+    - Counters about the run, for Azure the HTTP requests sent, the
+      connections opened to send them and the requests that reused a kept
+      alive connection.
+  returned: when reported by the client
+  type: dict
+  sample: {"connections": {"requests": 120, "connections": 8, "reused": 112}}
 """
 
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible_collections.pravic.pravic.plugins.module_utils.exception import CloudException, module_fail_from_exception
-from ansible_collections.pravic.pravic.plugins.module_utils.aws.client import AwsClient
-from ansible_collections.pravic.pravic.plugins.module_utils.azure.client import AzureClient
-
-
-ARG_SPEC = {
-    "resources": {"type": "dict", "required": True},
-    "state": {"type": "str", "choices": ["present", "absent"], "default": "present"},
-    "current_state": {"type": "dict"},
-    "connection": {"type": "dict"},
-    "client": {"type": "str", "choices": ["aws", "azure"], "required": True},
-}
-
-CLIENT_MAPPING = {
-    "aws": AwsClient,
-    "azure": AzureClient,
-}
+from ansible_collections.pravic.pravic.plugins.module_utils.runner import ARG_SPEC, make_client, run_client
 
 
 def main():
     module = AnsibleModule(argument_spec=ARG_SPEC, supports_check_mode=True)
     try:
-        client_obj = CLIENT_MAPPING.get(module.params.get("client"))
-        client = client_obj(check_mode=module.check_mode, **module.params.get("connection") or {})
-        result = client.run(
-            module.params.get("resources", []),
-            module.params.get("current_state", {}),
-            module.params["state"],
-            module.check_mode,
-        )
-        module.exit_json(changed=result["changed"], resources=result)
+        client = make_client(module.params, module.check_mode)
+        module.exit_json(**run_client(client, module.params, module.check_mode))
     except CloudException as e:
         module_fail_from_exception(module, e)
 
@@ -0,0 +1,267 @@
+# Copyright: (c) 2023, Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import fcntl
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+import traceback
+from typing import Any, Dict, List, Optional
+
+from ansible.module_utils.common.text.converters import to_text
+from ansible_collections.pravic.pravic.plugins.module_utils.resource import CloudClient
+from ansible_collections.pravic.pravic.plugins.module_utils.runner import make_client, run_client
+
+
+IDLE_TIMEOUT = 600.0
+CONNECT_TIMEOUT = 10.0
+MAX_CLIENTS = 16
+
+# every message is a JSON document prefixed with its length
+HEADER = struct.Struct("!Q")
+
+
+def daemon_dir() -> str:
+    return os.path.expanduser(os.environ.get("PRAVIC_DAEMON_DIR") or "~/.ansible/pravic")
+
+
+def socket_path() -> str:
+    return os.path.join(daemon_dir(), "daemon.sock")
+
+
+def send(sock: socket.socket, message: Any) -> None:
+    data = json.dumps(message).encode()
+    sock.sendall(HEADER.pack(len(data)) + data)
+
+
+def _read(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("Connection closed by the pravic daemon")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def receive(sock: socket.socket) -> Any:
+    (size,) = HEADER.unpack(_read(sock, HEADER.size))
+    return json.loads(_read(sock, size))
+
+
+class _Slot:
+    __slots__ = ("lock", "client", "users", "last")
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.client: Optional[CloudClient] = None
+        self.users = 0
+        self.last = time.monotonic()
+
+
+class Worker:
+    """Run tasks with cloud clients kept warm between them.
+
+    Clients are keyed by their provider, connection parameters and check
+    mode. Tasks using the same client run one after the other, since a client
+    is not meant to be shared by concurrent runs, tasks using different
+    clients run concurrently. Clients unused for ``idle_timeout`` seconds are
+    closed, as are the least recently used ones beyond ``max_clients``.
+    """
+
+    def __init__(self, max_clients: int = MAX_CLIENTS, idle_timeout: float = IDLE_TIMEOUT) -> None:
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        # in least recently used order
+        self._slots: Dict[str, _Slot] = {}
+        self._lock = threading.Lock()
+
+    def execute(self, params: Dict[str, Any], check_mode: bool) -> Dict[str, Any]:
+        key = json.dumps([params["client"], params.get("connection"), check_mode], sort_keys=True, default=str)
+        with self._lock:
+            slot = self._slots.pop(key, None) or _Slot()
+            self._slots[key] = slot
+            slot.users += 1
+            evicted = self._evict()
+        for client in evicted:
+            client.close()
+        try:
+            with slot.lock:
+                if slot.client is None:
+                    slot.client = make_client(params, check_mode)
+                return run_client(slot.client, params, check_mode)
+        finally:
+            with self._lock:
+                slot.users -= 1
+                slot.last = time.monotonic()
+
+    def _evict(self) -> List[CloudClient]:
+        """Drop the idle slots, the caller holds the lock."""
+        now = time.monotonic()
+        idle = [key for key, slot in self._slots.items() if not slot.users]
+        excess = len(self._slots) - self.max_clients
+        evicted = []
+        for key in idle:
+            if excess <= 0 and now - self._slots[key].last <= self.idle_timeout:
+                continue
+            client = self._slots.pop(key).client
+            excess -= 1
+            if client is not None:
+                evicted.append(client)
+        return evicted
+
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            return self.execute(request["params"], request["check_mode"])
+        except Exception as e:  # pylint: disable=broad-except
+            return {"failed": True, "msg": to_text(e), "exception": traceback.format_exc()}
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    server: "Server"
+
+    def handle(self) -> None:
+        self.server.enter()
+        try:
+            request = receive(self.request)
+            send(self.request, self.server.worker.handle(request))
+        finally:
+            self.server.leave()
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serve tasks on a Unix socket until no request came for ``idle_timeout`` seconds."""
+
+    daemon_threads = True
+
+    def __init__(self, path: str, idle_timeout: float = IDLE_TIMEOUT) -> None:
+        # set before binding, server_bind() needs it
+        self.path = path
+        super().__init__(path, _Handler)
+        self.worker = Worker()
+        self.idle_timeout = idle_timeout
+        self._active = 0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def enter(self) -> None:
+        with self._lock:
+            self._active += 1
+
+    def leave(self) -> None:
+        with self._lock:
+            self._active -= 1
+            self._last = time.monotonic()
+
+    def idle(self) -> bool:
+        with self._lock:
+            return not self._active and time.monotonic() - self._last > self.idle_timeout
+
+    def _watch(self) -> None:
+        while not self.idle():
+            time.sleep(min(1.0, self.idle_timeout))
+        self.shutdown()
+
+    def serve(self) -> None:
+        threading.Thread(target=self._watch, name="pravic-idle", daemon=True).start()
+        try:
+            self.serve_forever(poll_interval=0.5)
+        finally:
+            self.server_close()
+            try:
+                # a newer daemon may have replaced the socket in the meantime
+                if os.stat(self.path).st_ino == self._inode:
+                    os.unlink(self.path)
+            except OSError:
+                pass
+
+    def server_bind(self) -> None:
+        super().server_bind()
+        os.chmod(self.path, 0o600)
+        self._inode = os.stat(self.path).st_ino
+
+
+def spawn(path: str, idle_timeout: float = IDLE_TIMEOUT) -> None:
+    """Start a daemon serving ``path`` in a detached process.
+
+    The socket is bound before forking, so that connections made as soon as
+    this function returns are queued until the daemon accepts them.
+    """
+    server = Server(path, idle_timeout)
+    pid = os.fork()
+    if pid:
+        server.socket.close()
+        os.waitpid(pid, 0)
+        return
+    try:
+        os.setsid()
+        if os.fork():
+            os._exit(0)
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        # do not hold the pipes of the Ansible worker or the start lock open
+        fileno = server.fileno()
+        os.closerange(3, fileno)
+        os.closerange(fileno + 1, os.sysconf("SC_OPEN_MAX"))
+        server.serve()
+    finally:
+        os._exit(0)
+
+
+def _connect(path: str) -> socket.socket:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(path)
+        sock.settimeout(None)
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+
+def connect(path: Optional[str] = None) -> socket.socket:
+    """Connect to the daemon, starting it when it is not running."""
+    path = path or socket_path()
+    try:
+        return _connect(path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        pass
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    # serialise the start of the daemon between concurrent tasks
+    with open(path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            return _connect(path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            pass
+        try:
+            # left over by a daemon that did not exit cleanly
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        spawn(path)
+    return _connect(path)
+
+
+def execute(params: Dict[str, Any], check_mode: bool, path: Optional[str] = None) -> Dict[str, Any]:
+    """Run a task in the daemon and return its result.
+
+    A daemon exiting on idle may close the connection without answering, the
+    task is then sent once more, to a new daemon if needed.
+    """
+    for attempt in range(2):
+        try:
+            with connect(path) as sock:
+                send(sock, {"params": params, "check_mode": check_mode})
+                return receive(sock)
+        except ConnectionError:
+            if attempt:
+                raise
+    raise AssertionError("unreachable")
@@ -0,0 +1,226 @@
+# Copyright: (c) 2023, Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import abc
+import contextlib
+import fcntl
+import json
+import os
+import sqlite3
+import tempfile
+from typing import Dict, Iterable, Iterator, Optional, Type
+
+
+class StateBackend(abc.ABC):
+    """Store the state of the resources, one entry per resource name."""
+
+    def __init__(self, path: str) -> None:
+        self.path = os.path.expanduser(path)
+
+    @abc.abstractmethod
+    def load(self, keys: Optional[Iterable[str]] = None) -> Dict[str, Dict]:
+        """Return the stored resources, restricted to keys when given."""
+
+    @abc.abstractmethod
+    def update(self, changes: Dict[str, Optional[Dict]]) -> None:
+        """Store the changed resources, a None value removes the resource."""
+
+    def flush(self) -> None:
+        """Bring the state file up to date with every update."""
+
+    @contextlib.contextmanager
+    def _locked(self, operation: int) -> Iterator[None]:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path + ".lock", "a") as lock:
+            fcntl.flock(lock, operation)
+            yield
+
+    def _read_snapshot(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path) as fp:
+                return json.load(fp)
+        except FileNotFoundError:
+            return {}
+
+    def _write_snapshot(self, state: Dict[str, Dict]) -> None:
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as fp:
+                json.dump(state, fp, indent=True)
+                fp.flush()
+                os.fsync(fp.fileno())
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+def _select(state: Dict[str, Dict], keys: Optional[Iterable[str]]) -> Dict[str, Dict]:
+    if keys is None:
+        return state
+    return {key: state[key] for key in keys if key in state}
+
+
+def _apply(state: Dict[str, Dict], changes: Dict[str, Optional[Dict]]) -> None:
+    for name, value in changes.items():
+        if value is None:
+            state.pop(name, None)
+        else:
+            state[name] = value
+
+
+class JsonFileState(StateBackend):
+    """Keep the whole state in a JSON file, rewritten on every update."""
+
+    def load(self, keys: Optional[Iterable[str]] = None) -> Dict[str, Dict]:
+        with self._locked(fcntl.LOCK_SH):
+            return _select(self._read_snapshot(), keys)
+
+    def update(self, changes: Dict[str, Optional[Dict]]) -> None:
+        with self._locked(fcntl.LOCK_EX):
+            state = self._read_snapshot()
+            _apply(state, changes)
+            self._write_snapshot(state)
+
+
+class JournalState(StateBackend):
+    """Append the changes to a journal next to a JSON snapshot of the state.
+
+    An update only appends one line per changed resource to the journal.
+    Once the journal outgrows the snapshot, both are compacted into a new
+    snapshot, written to a temporary file and renamed over the previous one.
+    The snapshot has the format of :class:`JsonFileState`, so existing state
+    files are read as is.
+    """
+
+    COMPACT_SIZE = 1024 * 1024
+
+    @property
+    def journal(self) -> str:
+        return self.path + ".journal"
+
+    def _read(self) -> Dict[str, Dict]:
+        state = self._read_snapshot()
+        try:
+            with open(self.journal) as fp:
+                for line in fp:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # the last line of an interrupted update
+                        continue
+                    _apply(state, {entry["name"]: entry["value"]})
+        except FileNotFoundError:
+            pass
+        return state
+
+    def load(self, keys: Optional[Iterable[str]] = None) -> Dict[str, Dict]:
+        with self._locked(fcntl.LOCK_SH):
+            return _select(self._read(), keys)
+
+    def update(self, changes: Dict[str, Optional[Dict]]) -> None:
+        if not changes:
+            return
+        lines = "".join(json.dumps({"name": name, "value": value}) + "\n" for name, value in changes.items())
+        with self._locked(fcntl.LOCK_EX):
+            with open(self.journal, "a+") as fp:
+                if fp.tell():
+                    fp.seek(fp.tell() - 1)
+                    if fp.read(1) != "\n":
+                        # start after the last line of an interrupted update
+                        lines = "\n" + lines
+                fp.write(lines)
+                fp.flush()
+                os.fsync(fp.fileno())
+                size = fp.tell()
+            try:
+                snapshot_size = os.path.getsize(self.path)
+            except FileNotFoundError:
+                snapshot_size = 0
+            if size > max(self.COMPACT_SIZE, snapshot_size):
+                self.compact()
+
+    def flush(self) -> None:
+        with self._locked(fcntl.LOCK_EX):
+            try:
+                if not os.path.getsize(self.journal):
+                    return
+            except FileNotFoundError:
+                return
+            self.compact()
+
+    def compact(self) -> None:
+        """Fold the journal into the snapshot, the caller holds the exclusive lock."""
+        self._write_snapshot(self._read())
+        # replaying the journal again on the new snapshot is harmless, so a
+        # crash before the truncation does not lose anything
+        os.truncate(self.journal, 0)
+
+
+class SqliteState(StateBackend):
+    """Keep the state in a SQLite database, one row per resource.
+
+    Rows are keyed by resource name, so that tasks only read the rows they
+    need, and the database runs in WAL mode so that readers do not wait for
+    writers.
+    """
+
+    # stay below the historical limit of 999 parameters per statement
+    BATCH = 500
+
+    SCHEMA = ("CREATE TABLE IF NOT EXISTS resources (name TEXT PRIMARY KEY, data TEXT NOT NULL)",)
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=60)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            with connection:
+                for statement in self.SCHEMA:
+                    connection.execute(statement)
+            yield connection
+        finally:
+            connection.close()
+
+    def load(self, keys: Optional[Iterable[str]] = None) -> Dict[str, Dict]:
+        with self._connect() as connection:
+            if keys is None:
+                rows = connection.execute("SELECT name, data FROM resources").fetchall()
+            else:
+                keys = list(keys)
+                rows = []
+                for start in range(0, len(keys), self.BATCH):
+                    end = start + self.BATCH
+                    batch = keys[start:end]
+                    query = "SELECT name, data FROM resources WHERE name IN ({0})".format(", ".join("?" * len(batch)))
+                    rows.extend(connection.execute(query, batch))
+        return {name: json.loads(data) for name, data in rows}
+
+    def update(self, changes: Dict[str, Optional[Dict]]) -> None:
+        if not changes:
+            return
+        removed = [(name,) for name, value in changes.items() if value is None]
+        upserts = [(name, json.dumps(value)) for name, value in changes.items() if value is not None]
+        with self._connect() as connection:
+            with connection:
+                connection.executemany("DELETE FROM resources WHERE name = ?", removed)
+                connection.executemany(
+                    "INSERT INTO resources (name, data) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET data = excluded.data",
+                    upserts,
+                )
+
+
+BACKENDS: Dict[str, Type[StateBackend]] = {
+    "json": JsonFileState,
+    "journal": JournalState,
+    "sqlite": SqliteState,
+}
+
+
+def get_backend(name: Optional[str], path: str) -> StateBackend:
+    """Return the state backend called name, the JSON file by default."""
+    try:
+        return BACKENDS[name or "json"](path)
+    except KeyError:
+        raise ValueError("Unknown state backend {0}, expected one of {1}".format(name, ", ".join(sorted(BACKENDS))))
@@ -0,0 +1,118 @@
+# Copyright: (c) 2023, Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from ansible_collections.pravic.pravic.plugins.action.resources import ActionModule
+from ansible_collections.pravic.pravic.plugins.module_utils.exception import CloudException
+from ansible_collections.pravic.pravic.plugins.plugin_utils.state import get_backend
+
+PATCH_BASE_PATH = "ansible_collections.pravic.pravic.plugins.action.resources."
+
+
+@pytest.fixture
+def action():
+    def _action(args, check_mode=False):
+        task = MagicMock()
+        task.args = args
+        task.async_val = 0
+        play_context = MagicMock()
+        play_context.check_mode = check_mode
+        return ActionModule(task, MagicMock(), play_context, MagicMock(), MagicMock(), MagicMock())
+
+    return _action
+
+
+@patch(PATCH_BASE_PATH + "make_client")
+def test_run_controller(m_make_client, action, tmp_path):
+    state_file = tmp_path / "state.json"
+    state_file.write_text(json.dumps({"a": {"Type": "AWS::S3::Bucket"}, "unrelated": {"Type": "AWS::S3::Bucket"}}))
+    client = m_make_client.return_value
+    client.run.return_value = {"changed": True, "a": {"Type": "AWS::S3::Bucket"}}
+    client.metrics.return_value = {"connections": {"requests": 1, "connections": 1, "reused": 0}}
+
+    plugin = action({"client": "aws", "resources": {"a": {"Type": "AWS::S3::Bucket"}}, "execution": "controller"}, check_mode=True)
+    with patch.object(plugin, "_execute_module") as m_execute_module:
+        result = plugin.run(task_vars={"state_file": str(state_file)})
+    m_execute_module.assert_not_called()
+
+    assert result == {
+        "changed": True,
+        "resources": {"changed": True, "a": {"Type": "AWS::S3::Bucket"}},
+        "metrics": {"connections": {"requests": 1, "connections": 1, "reused": 0}},
+        "removed": [],
+    }
+    assert m_make_client.call_args[0][1] is True
+    args, kwargs = client.run.call_args
+    assert args == ({"a": {"Type": "AWS::S3::Bucket"}}, {"a": {"Type": "AWS::S3::Bucket"}}, "present", True)
+    assert kwargs["trust_state"] is False
+
+
+@patch(PATCH_BASE_PATH + "make_client")
+def test_run_controller_failure(m_make_client, action):
+    m_make_client.return_value.run.side_effect = CloudException("boom")
+    result = action({"client": "aws", "resources": {}, "execution": "controller"}).run(task_vars={})
+    assert result["failed"] is True
+    assert result["msg"] == "boom"
+    assert "CloudException" in result["exception"]
+
+
+def test_run_controller_invalid_arguments(action):
+    result = action({"client": "gcp", "resources": {}, "execution": "controller"}).run(task_vars={})
+    assert result["failed"] is True
+    assert "client" in result["msg"]
+
+
+@patch(PATCH_BASE_PATH + "make_client")
+def test_run_state_slice(m_make_client, action, tmp_path):
+    state = {name: {"Type": "AWS::EC2::VPC", "Properties": {"VpcId": name}} for name in ("vpc", "subnet", "other")}
+    state_file = tmp_path / "state.json"
+    state_file.write_text(json.dumps(state))
+    resources = {"subnet": {"Type": "AWS::EC2::Subnet", "Properties": {"VpcId": "resource:vpc.Properties.VpcId"}}, "new": {"Type": "AWS::S3::Bucket"}}
+
+    plugin = action({"client": "aws", "resources": resources})
+    with patch.object(plugin, "_execute_module") as m_execute_module:
+        plugin.run(task_vars={"state_file": str(state_file)})
+    assert m_execute_module.call_args[1]["module_args"]["current_state"] == {"vpc": state["vpc"], "subnet": state["subnet"]}
+
+
+@pytest.mark.parametrize("state_backend", ["json", "journal"])
+@patch(PATCH_BASE_PATH + "make_client")
+def test_run_removed(m_make_client, action, tmp_path, state_backend):
+    state_file = tmp_path / "state.json"
+    get_backend(state_backend, str(state_file)).update({"a": {"Type": "AWS::S3::Bucket"}, "b": {"Type": "AWS::S3::Bucket"}})
+    m_make_client.return_value.run.return_value = {"changed": True, "b": {"Type": "AWS::S3::Bucket"}}
+
+    resources = {"a": {"Type": "AWS::S3::Bucket"}, "b": {"Type": "AWS::S3::Bucket"}, "c": {"Type": "AWS::S3::Bucket"}}
+    plugin = action({"client": "aws", "resources": resources, "state": "absent", "execution": "controller"})
+    result = plugin.run(task_vars={"state_file": str(state_file), "state_backend": state_backend})
+    assert result["removed"] == ["a"]
+
+
+@pytest.mark.parametrize(
+    "state_backend,content,msg",
+    [
+        ("yaml", "{}", "Unknown state backend yaml"),
+        ("json", "{not json", "Failed to load the state"),
+        ("sqlite", "not a database", "Failed to load the state"),
+    ],
+)
+def test_run_state_errors(action, tmp_path, state_backend, content, msg):
+    state_file = tmp_path / "state.json"
+    state_file.write_text(content)
+    plugin = action({"client": "aws", "resources": {"a": {"Type": "AWS::S3::Bucket"}}})
+    with patch.object(plugin, "_execute_module") as m_execute_module:
+        result = plugin.run(task_vars={"state_file": str(state_file), "state_backend": state_backend})
+    m_execute_module.assert_not_called()
+    assert result["failed"] is True
+    assert msg in result["msg"]
+
+
+def test_run_missing_state_file(action, tmp_path):
+    plugin = action({"client": "aws", "resources": {"a": {"Type": "AWS::S3::Bucket"}}})
+    with patch.object(plugin, "_execute_module") as m_execute_module:
+        plugin.run(task_vars={"state_file": str(tmp_path / "state.json")})
+    assert m_execute_module.call_args[1]["module_args"]["current_state"] == {}
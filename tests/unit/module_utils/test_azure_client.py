@@ -0,0 +1,353 @@
+# Copyright: (c) 2023, Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import concurrent.futures
+import http.server
+import json
+import socketserver
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from ansible_collections.pravic.pravic.plugins.module_utils.azure.client import ApiVersions, AzureClient, ConnectionPool
+from ansible_collections.pravic.pravic.plugins.module_utils.cache import FileCache
+from ansible_collections.pravic.pravic.plugins.module_utils.exception import CloudException
+from ansible_collections.pravic.pravic.plugins.module_utils.poller import Backoff, Poller
+
+PATCH_BASE_PATH = "ansible_collections.pravic.pravic.plugins.module_utils.azure.client."
+
+SUBSCRIPTION = "00000000-0000-0000-0000-000000000000"
+
+PROVIDERS = {
+    "Microsoft.Storage": {
+        "namespace": "Microsoft.Storage",
+        "resourceTypes": [{"resourceType": "storageAccounts", "apiVersions": ["2022-09-01", "2021-09-01"]}],
+    },
+    "Microsoft.Network": {
+        "namespace": "Microsoft.Network",
+        "resourceTypes": [{"resourceType": "virtualNetworks", "apiVersions": ["2022-07-01"]}],
+    },
+}
+
+
+def response(body, status_code=200, headers=None):
+    result = MagicMock()
+    result.text = json.dumps(body) if body is not None else ""
+    result.status_code = status_code
+    result.headers = headers or {}
+    return result
+
+
+@pytest.fixture
+def rest_client():
+    client = MagicMock()
+    client.subscription_id = SUBSCRIPTION
+
+    def query(url, method, *args):
+        if url.endswith("/providers"):
+            return response({"value": list(PROVIDERS.values())})
+        return response(PROVIDERS[url.split("/")[-1]])
+
+    client.query.side_effect = query
+    return client
+
+
+@pytest.fixture
+def azure_client(rest_client, tmp_path):
+    with patch(PATCH_BASE_PATH + "AzureRestClient", return_value=rest_client):
+        yield AzureClient(api_version_cache={"path": str(tmp_path)})
+
+
+def test_api_version(azure_client, rest_client):
+    url = "/subscriptions/{0}/resourceGroups/rg/providers/Microsoft.Storage/storageAccounts/sa{1}"
+    assert {azure_client._get_api_version(url.format(SUBSCRIPTION, i)) for i in range(10)} == {"2022-09-01"}
+    assert rest_client.query.call_count == 1
+    assert azure_client._get_api_version("/subscriptions/{0}/resourceGroups/rg".format(SUBSCRIPTION)) == "2018-05-01"
+    with pytest.raises(CloudException, match="Couldn't find api version for Microsoft.Storage/queues"):
+        azure_client._get_api_version("/subscriptions/{0}/resourceGroups/rg/providers/Microsoft.Storage/queues/q".format(SUBSCRIPTION))
+
+
+def test_api_version_single_flight(rest_client):
+    calls = []
+    query = rest_client.query.side_effect
+
+    def slow_query(*args):
+        calls.append(args)
+        time.sleep(0.05)
+        return query(*args)
+
+    rest_client.query.side_effect = slow_query
+    api_versions = ApiVersions(rest_client)
+    threads = [threading.Thread(target=api_versions.get, args=(SUBSCRIPTION, "Microsoft.Storage", "storageAccounts")) for _i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+
+
+def test_api_version_disk_cache(rest_client, tmp_path):
+    ApiVersions(rest_client, FileCache("api_versions", path=str(tmp_path))).get(SUBSCRIPTION, "Microsoft.Storage", "storageAccounts")
+    rest_client.query.reset_mock()
+    api_versions = ApiVersions(rest_client, FileCache("api_versions", path=str(tmp_path)))
+    assert api_versions.get(SUBSCRIPTION, "microsoft.storage", "StorageAccounts") == "2022-09-01"
+    rest_client.query.assert_not_called()
+
+
+@pytest.mark.parametrize("prewarm,urls", [(False, 2), (True, 1)])
+def test_prefetch_api_versions(rest_client, tmp_path, prewarm, urls):
+    with patch(PATCH_BASE_PATH + "AzureRestClient", return_value=rest_client):
+        client = AzureClient(api_version_cache={"path": str(tmp_path), "prewarm": prewarm}, batch_reads=False)
+    desired_state = {
+        "sa": {"provider": "Microsoft.Storage", "type": "storageAccounts", "name": "sa"},
+        "vnet": {"provider": "Microsoft.Network", "type": "virtualNetworks", "name": "vnet"},
+        "pinned": {"provider": "Microsoft.Compute", "type": "disks", "name": "d", "api-version": "2022-03-02"},
+        "rg": {"subscriptionId": "resource:sub.id", "provider": "Microsoft.Resources", "type": "resourceGroups"},
+    }
+    client.prefetch(desired_state, {})
+    assert rest_client.query.call_count == urls
+    assert client.api_versions.get(SUBSCRIPTION, "Microsoft.Network", "virtualNetworks") == "2022-07-01"
+    assert rest_client.query.call_count == urls
+
+
+ACCOUNT_URL = "/subscriptions/{0}/resourceGroups/rg/providers/Microsoft.Storage/storageAccounts/sa".format(SUBSCRIPTION)
+ACCOUNT = {"provider": "Microsoft.Storage", "type": "storageAccounts", "name": "sa", "resourceGroupName": "rg", "api-version": "2022-09-01"}
+
+
+@pytest.fixture
+def lro_client(azure_client):
+    azure_client.poller = Poller(Backoff(0, 0))
+    azure_client._get_resource_url = MagicMock(return_value=ACCOUNT_URL)
+    return azure_client
+
+
+def scripted(rest_client, responses):
+    """Answer the queries of rest_client in order, recording (method, url)."""
+    calls = []
+
+    def query(url, method, *args):
+        calls.append((method, url))
+        return responses.pop(0)
+
+    rest_client.query.side_effect = query
+    return calls
+
+
+def test_present_async_operation(lro_client, rest_client):
+    operation = "https://management.azure.com/operations/1?api-version=2022-09-01"
+    created = {"id": ACCOUNT_URL, "properties": {"provisioningState": "Succeeded"}}
+    calls = scripted(
+        rest_client,
+        [
+            response(None, 404),
+            response({"properties": {"provisioningState": "Creating"}}, 202, {"Azure-AsyncOperation": operation, "Retry-After": "0"}),
+            response({"status": "InProgress"}, headers={"Retry-After": "0"}),
+            response({"status": "Succeeded"}),
+            response(created),
+        ],
+    )
+    assert lro_client.present(ACCOUNT) == {"changed": True, **created}
+    assert calls == [("GET", ACCOUNT_URL), ("PUT", ACCOUNT_URL), ("GET", operation), ("GET", operation), ("GET", ACCOUNT_URL)]
+
+
+def test_present_provisioning_state(lro_client, rest_client):
+    created = {"id": ACCOUNT_URL, "properties": {"provisioningState": "Succeeded"}}
+    calls = scripted(
+        rest_client,
+        [
+            response(None, 404),
+            response({"id": ACCOUNT_URL, "properties": {"provisioningState": "Creating"}}, 201),
+            response({"id": ACCOUNT_URL, "properties": {"provisioningState": "Creating"}}),
+            response(created),
+            response(created),
+        ],
+    )
+    assert lro_client.present(ACCOUNT) == {"changed": True, **created}
+    assert len(calls) == 5
+
+
+def test_present_synchronous(lro_client, rest_client):
+    created = {"id": ACCOUNT_URL, "properties": {"provisioningState": "Succeeded"}}
+    calls = scripted(rest_client, [response(None, 404), response(created, 201)])
+    assert lro_client.present(ACCOUNT) == {"changed": True, **created}
+    assert len(calls) == 2
+
+
+def test_present_async_operation_failed(lro_client, rest_client):
+    operation = "https://management.azure.com/operations/1"
+    scripted(
+        rest_client,
+        [
+            response(None, 404),
+            response(None, 201, {"Azure-AsyncOperation": operation}),
+            response({"status": "Failed", "error": {"code": "Conflict", "message": "name already taken"}}),
+        ],
+    )
+    with pytest.raises(CloudException, match="Microsoft.Storage/storageAccounts failed: name already taken"):
+        lro_client.present(ACCOUNT)
+
+
+def test_absent_location(lro_client, rest_client):
+    location = "https://management.azure.com/operationresults/1"
+    calls = scripted(
+        rest_client,
+        [
+            response({"id": ACCOUNT_URL}),
+            response(None, 202, {"Location": location, "Retry-After": "0"}),
+            response(None, 202, {"Retry-After": "0"}),
+            response(None, 200),
+        ],
+    )
+    lro_client.limiter = MagicMock(wraps=lro_client.limiter)
+    assert lro_client.absent(ACCOUNT) == {"changed": True, "id": ACCOUNT_URL}
+    assert calls[1:] == [("DELETE", ACCOUNT_URL), ("GET", location), ("GET", location)]
+    # the read and both polls are rate limited
+    assert lro_client.limiter.request.call_count == 3
+
+
+def test_default_timeout(azure_client):
+    assert azure_client.timeouts.get("Microsoft.Network/virtualNetworkGateways") == 3600
+
+
+def test_absent_timeout(lro_client, rest_client):
+    lro_client.timeouts = MagicMock()
+    lro_client.timeouts.get.return_value = 0
+    scripted(rest_client, [response({"id": ACCOUNT_URL}), response(None, 202)] + [response({"id": ACCOUNT_URL}) for _i in range(5)])
+    with pytest.raises(CloudException, match="Timed out waiting for deletion of"):
+        lro_client.absent(ACCOUNT)
+    lro_client.timeouts.get.assert_called_with("Microsoft.Storage/storageAccounts")
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def http_url():
+    server = _Server(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield "http://127.0.0.1:{0}/".format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+def test_connection_pool(http_url):
+    pytest.importorskip("requests")
+    pool = ConnectionPool(maxsize=2)
+    pool.resize(1)
+    assert pool.maxsize == 2
+    pool.resize(8)
+
+    def get(_i):
+        pool.session().get(http_url).close()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(get, range(80)))
+    stats = pool.stats()
+    assert stats["requests"] == 80
+    assert stats["connections"] <= 8
+    assert stats["reused"] == 80 - stats["connections"]
+
+    # connections of the previous pool are still counted, and closed
+    previous = pool._adapter
+    pool.resize(16)
+    assert not previous.poolmanager.pools
+    get(0)
+    assert pool.stats()["requests"] == 81
+
+    pool.close()
+    assert pool.stats()["requests"] == 81
+    get(0)
+    assert pool.stats()["requests"] == 82
+
+
+def test_metrics(azure_client, rest_client):
+    rest_client.pool.stats.side_effect = [{"requests": 10, "connections": 2, "reused": 8}, {"requests": 15, "connections": 3, "reused": 12}]
+    assert azure_client.metrics() == {"connections": {"requests": 10, "connections": 2, "reused": 8}}
+    assert azure_client.metrics() == {"connections": {"requests": 5, "connections": 1, "reused": 4}}
+
+
+def test_set_concurrency(azure_client, rest_client):
+    azure_client.set_concurrency(4)
+    rest_client.pool.resize.assert_called_with(16)
+    azure_client.set_concurrency(50)
+    rest_client.pool.resize.assert_called_with(50)
+
+
+def test_batch_reads(azure_client, rest_client):
+    accounts = {"sa{0}".format(i): dict(ACCOUNT, name="sa{0}".format(i)) for i in range(45)}
+    desired_state = dict(accounts, ref={"provider": "Microsoft.Storage", "type": "storageAccounts", "name": "resource:sa0.name"})
+    azure_client._get_resource_url = lambda resource: "{0}/{1}".format(ACCOUNT_URL[:-3], resource["name"])
+    batches = []
+
+    def query(url, method, query_parameters, header_parameters, body, *args):
+        if url == "/batch":
+            batches.append(body["requests"])
+            responses = []
+            for request in body["requests"]:
+                name = request["url"].split("/")[-1].split("?")[0]
+                status = {"sa1": 404, "sa2": 429}.get(name, 200)
+                responses.append({"name": request["name"], "httpStatusCode": status, "content": {"name": name} if status == 200 else {}})
+            return response({"responses": responses})
+        return response({"name": url.split("/")[-1]})
+
+    rest_client.query.side_effect = query
+    azure_client.prefetch(desired_state, {})
+    assert [len(batch) for batch in batches] == [20, 20, 5]
+    assert batches[0][0] == {"name": "0", "httpMethod": "GET", "url": ACCOUNT_URL[:-3] + "/sa0?api-version=2022-09-01"}
+
+    rest_client.query.reset_mock()
+    existing = {name: azure_client._get_existing_resource(resource)[2] for name, resource in accounts.items()}
+    assert existing["sa0"] == {"name": "sa0"}
+    assert existing["sa1"] == {}
+    # throttled sub-requests are read again
+    assert existing["sa2"] == {"name": "sa2"}
+    assert [call.args[:2] for call in rest_client.query.call_args_list] == [(ACCOUNT_URL[:-3] + "/sa2", "GET")]
+
+    # the snapshot is only used once
+    azure_client._get_existing_resource(accounts["sa0"])
+    assert rest_client.query.call_count == 2
+
+
+def test_batch_reads_skip_dependent_resources(azure_client, rest_client):
+    # the URL of dependent is known, its body depends on sa0
+    dependent = dict(ACCOUNT, name="dependent", properties={"subnet": "resource:sa0.id"})
+    desired_state = {"sa0": dict(ACCOUNT, name="sa0"), "sa1": dict(ACCOUNT, name="sa1"), "dependent": dependent}
+    azure_client._get_resource_url = lambda resource: "{0}/{1}".format(ACCOUNT_URL[:-3], resource["name"])
+    rest_client.query.return_value = response({"responses": []})
+    azure_client.prefetch(desired_state, {})
+    requests = rest_client.query.call_args.args[4]["requests"]
+    assert [request["url"].split("?")[0].split("/")[-1] for request in requests] == ["sa0", "sa1"]
+
+
+def test_batch_reads_failure(azure_client, rest_client):
+    azure_client._get_resource_url = lambda resource: "{0}/{1}".format(ACCOUNT_URL[:-3], resource["name"])
+    rest_client.query.side_effect = CloudException("batch unavailable")
+    azure_client.prefetch({"sa0": dict(ACCOUNT, name="sa0"), "sa1": dict(ACCOUNT, name="sa1")}, {})
+    assert azure_client._snapshot == {}
+
+
+def test_batch_reads_transport_error(azure_client, rest_client):
+    class ClientRequestError(Exception):
+        pass
+
+    azure_client._get_resource_url = lambda resource: "{0}/{1}".format(ACCOUNT_URL[:-3], resource["name"])
+    rest_client.query.side_effect = ClientRequestError("Connection reset by peer")
+    with patch(PATCH_BASE_PATH + "ClientException", ClientRequestError):
+        azure_client.prefetch({"sa0": dict(ACCOUNT, name="sa0"), "sa1": dict(ACCOUNT, name="sa1")}, {})
+    assert azure_client._snapshot == {}
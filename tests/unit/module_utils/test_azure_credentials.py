@@ -0,0 +1,85 @@
+# Copyright: (c) 2023, Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from ansible_collections.pravic.pravic.plugins.module_utils.azure.credentials import AzureCredentials, CachedTokenCredentials, TokenCache
+from ansible_collections.pravic.pravic.plugins.module_utils.cache import FileCache
+from ansible_collections.pravic.pravic.plugins.module_utils.exception import CloudException
+
+PATCH_BASE_PATH = "ansible_collections.pravic.pravic.plugins.module_utils.azure.credentials."
+
+KEY = ["client_secret", "https://login.microsoftonline.com", "tenant", "client", "https://management.azure.com/", None]
+
+
+@pytest.fixture
+def token_cache(tmp_path):
+    return TokenCache(FileCache("azure_tokens", path=str(tmp_path)))
+
+
+def credentials(**token):
+    result = MagicMock()
+    result.token = dict(access_token="token", token_type="Bearer", **token)
+    return result
+
+
+def authorization(credentials):
+    session = MagicMock()
+    session.headers = {}
+    return credentials.signed_session(session).headers["Authorization"]
+
+
+@pytest.mark.parametrize(
+    "token",
+    [
+        {"expires_on": str(int(time.time()) + 3600)},
+        {"expires_on": "2023-06-01 12:00:00.000000", "expires_in": 3600},
+    ],
+)
+def test_token_cache_reuse(token_cache, token):
+    acquire = MagicMock(return_value=credentials(**token))
+    assert token_cache.credentials(KEY, acquire) is acquire.return_value
+    cached = token_cache.credentials(KEY, acquire)
+    assert isinstance(cached, CachedTokenCredentials)
+    assert authorization(cached) == "Bearer token"
+    acquire.assert_called_once()
+
+    # only the token is stored
+    assert set(token_cache.cache.get(KEY)) == {"access_token", "token_type", "expires_at"}
+
+
+def test_token_cache_refresh(token_cache):
+    acquire = MagicMock(return_value=credentials(expires_in=TokenCache.MARGIN - 1))
+    token_cache.credentials(KEY, acquire)
+    token_cache.credentials(KEY, acquire)
+    assert acquire.call_count == 2
+
+    # tokens without a lifetime are not cached
+    acquire = MagicMock(return_value=credentials())
+    token_cache.credentials(["other"], acquire)
+    assert token_cache.cache.get(["other"]) is None
+
+
+def test_cached_token_expiry(token_cache):
+    token_cache.set(KEY, {"access_token": "cached", "expires_in": 3600})
+    fresh = credentials(expires_in=3600)
+    fresh.signed_session.side_effect = lambda session: session
+    acquire = MagicMock(return_value=fresh)
+    cached = token_cache.credentials(KEY, acquire)
+    assert authorization(cached) == "Bearer cached"
+
+    # the token is about to expire during a long run
+    token_cache.MARGIN = 3600
+    cached.signed_session(MagicMock())
+    cached.signed_session(MagicMock())
+    acquire.assert_called_once()
+    assert fresh.signed_session.call_count == 2
+
+
+@patch(PATCH_BASE_PATH + "HAS_CRYPTOGRAPHY", False)
+def test_token_cache_requires_cryptography():
+    with pytest.raises(CloudException, match="cryptography"):
+        AzureCredentials.__new__(AzureCredentials)._get_token_cache({"enabled": True})
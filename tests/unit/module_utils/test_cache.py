@@ -0,0 +1,64 @@
+# Copyright: (c) 2023, Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import os
+from unittest.mock import patch
+
+import pytest
+
+from ansible_collections.pravic.pravic.plugins.module_utils.cache import EncryptedFileCache, FileCache
+
+PATCH_BASE_PATH = "ansible_collections.pravic.pravic.plugins.module_utils.cache."
+
+
+def test_file_cache(tmp_path):
+    cache = FileCache("schemas", path=str(tmp_path))
+    assert cache.get(["us-east-1", "AWS::IAM::Role"]) is None
+    cache.set(["us-east-1", "AWS::IAM::Role"], {"typeName": "AWS::IAM::Role"})
+    assert cache.get(["us-east-1", "AWS::IAM::Role"]) == {"typeName": "AWS::IAM::Role"}
+    assert cache.get(["eu-west-1", "AWS::IAM::Role"]) is None
+    assert os.listdir(tmp_path / "schemas")
+
+
+@patch(PATCH_BASE_PATH + "time")
+def test_file_cache_ttl(m_time, tmp_path):
+    m_time.time.return_value = 1000
+    cache = FileCache("schemas", path=str(tmp_path), ttl=60)
+    cache.set("key", "value")
+    m_time.time.return_value = 1060
+    assert cache.get("key") == "value"
+    m_time.time.return_value = 1061
+    assert cache.get("key") is None
+
+
+def test_file_cache_eviction(tmp_path):
+    cache = FileCache("schemas", path=str(tmp_path), max_size=250)
+    cache.set("first", "x" * 100)
+    os.utime(cache._filename(cache._key("first")), (0, 0))
+    cache.set("second", "x" * 100)
+    assert cache.get("first") is None
+    assert cache.get("second") == "x" * 100
+
+
+def test_file_cache_unwritable(tmp_path):
+    path = tmp_path / "file"
+    path.write_text("")
+    cache = FileCache("schemas", path=str(path))
+    cache.set("key", "value")
+    assert cache.get("key") is None
+
+
+def test_encrypted_file_cache(tmp_path):
+    pytest.importorskip("cryptography")
+    key_file = tmp_path / "keys" / "cache.key"
+    cache = EncryptedFileCache("tokens", path=str(tmp_path), key_file=str(key_file))
+    cache.set("token", {"access_token": "secret"})
+    assert cache.get("token") == {"access_token": "secret"}
+    assert oct(key_file.stat().st_mode & 0o777) == "0o600"
+    for name in os.listdir(tmp_path / "tokens"):
+        assert b"secret" not in (tmp_path / "tokens" / name).read_bytes()
+
+    # the key is reused by the next runs
+    assert EncryptedFileCache("tokens", path=str(tmp_path), key_file=str(key_file)).get("token") == {"access_token": "secret"}
+    # entries encrypted with another key are misses
+    assert EncryptedFileCache("tokens", path=str(tmp_path), key_file=str(tmp_path / "other.key")).get("token") is None
@@ -3,20 +3,26 @@
 
 import os
 import json
+import threading
 
 from pathlib import Path
 from unittest.mock import Mock, MagicMock
 from unittest import mock
 
 import pytest
-
+from botocore.exceptions import ClientError
 
 from ansible_collections.pravic.pravic.plugins.module_utils.aws.client import (
     AwsClient,
     Discoverer,
     Resource,
     ResourceType,
+    schema_path,
 )
+from ansible_collections.pravic.pravic.plugins.module_utils.cache import FileCache
+from ansible_collections.pravic.pravic.plugins.module_utils.exception import CloudException
+from ansible_collections.pravic.pravic.plugins.module_utils.poller import Backoff, Durations, Poller, Timeouts
+from ansible_collections.pravic.pravic.plugins.module_utils.resource import RateLimiter
 
 
 def resources(filepath):
@@ -42,13 +48,116 @@ def test_resource_type(mock_resource_type):
     assert isinstance(mock_resource_type, ResourceType)
     assert mock_resource_type.type_name == "AWS::IAM::Role"
     assert mock_resource_type.identifier == "RoleName"
-    assert mock_resource_type.read_only_properties == ["Arn", "RoleId"]
+    assert mock_resource_type.read_only_properties == frozenset(["Arn", "RoleId"])
+    assert mock_resource_type.create_only_properties == frozenset(["Path", "RoleName"])
+    assert mock_resource_type.primary_identifier == (("RoleName",),)
     assert isinstance(mock_resource_type.make(RESOURCE), Resource)
 
 
 def test_resource_type_empty_schema():
     resource_type = ResourceType({})
     assert isinstance(resource_type, ResourceType)
+    assert resource_type.identifier is None
+    assert resource_type.read_only_properties == frozenset()
+
+
+@pytest.mark.parametrize(
+    "pointer,expected",
+    [
+        ("/properties/Arn", ("Arn",)),
+        ("/properties/Endpoint/Address", ("Endpoint", "Address")),
+        ("/properties/Tags/*/Key", ("Tags", "Key")),
+        ("/properties/Rules/0/Id", ("Rules", "Id")),
+    ],
+)
+def test_schema_path(pointer, expected):
+    assert schema_path(pointer) == expected
+
+
+def test_resource_type_property_index(mock_resource_type):
+    assert mock_resource_type.property_schema(("Tags",))["insertionOrder"] is False
+    assert mock_resource_type.property_schema(("Tags", "Key"))["type"] == "string"
+    assert mock_resource_type.property_schema(("Policies", "PolicyName"))["maxLength"] == 128
+    assert mock_resource_type.property_schema(("Unknown",)) == {}
+
+
+@pytest.mark.parametrize(
+    "existing,desired,expected",
+    [
+        ({"Path": "/", "Arn": "arn"}, {"Arn": "other", "Description": "role"}, [{"op": "add", "path": "/Description", "value": "role"}]),
+        ({"Description": "role"}, {"Description": "new"}, [{"op": "replace", "path": "/Description", "value": "new"}]),
+        ({"Description": "role", "Path": "/"}, {"Description": None, "Path": "/"}, [{"op": "remove", "path": "/Description"}]),
+        (
+            {"AssumeRolePolicyDocument": {"Version": "2012-10-17", "Statement": [{"Effect": "Allow", "Action": "sts:AssumeRole"}]}},
+            {"AssumeRolePolicyDocument": {"Version": "2012-10-17", "Statement": [{"Effect": "Deny", "Action": "sts:AssumeRole"}]}},
+            [{"op": "replace", "path": "/AssumeRolePolicyDocument/Statement/0/Effect", "value": "Deny"}],
+        ),
+        (
+            {"Tags": [{"Key": "a", "Value": "1"}, {"Key": "b", "Value": "2"}]},
+            {"Tags": [{"Key": "b", "Value": "2"}, {"Key": "a", "Value": "1"}]},
+            [],
+        ),
+        (
+            {"Tags": [{"Key": "a", "Value": "1"}, {"Key": "b", "Value": "2"}]},
+            {"Tags": [{"Key": "b", "Value": "3"}, {"Key": "a", "Value": "1"}]},
+            [{"op": "replace", "path": "/Tags", "value": [{"Key": "b", "Value": "3"}, {"Key": "a", "Value": "1"}]}],
+        ),
+        (
+            {"Policies": [{"PolicyName": "p", "PolicyDocument": {"Statement": []}, "Extra": True}]},
+            {"Policies": [{"PolicyName": "p", "PolicyDocument": {"Statement": []}}]},
+            [],
+        ),
+        (
+            {"Statement": ["a", "b"]},
+            {"Statement": ["b", "a"]},
+            [{"op": "replace", "path": "/Statement/0", "value": "b"}, {"op": "replace", "path": "/Statement/1", "value": "a"}],
+        ),
+        ({"Statement": ["a"]}, {"Statement": ["a", "b"]}, [{"op": "replace", "path": "/Statement", "value": ["a", "b"]}]),
+        ({"a/b": {"c~d": 1}}, {"a/b": {"c~d": 2}}, [{"op": "replace", "path": "/a~1b/c~0d", "value": 2}]),
+    ],
+)
+def test_resource_type_diff(mock_resource_type, existing, desired, expected):
+    assert mock_resource_type.diff(existing, desired) == expected
+
+
+def test_resource_type_diff_skips_write_only():
+    resource_type = ResourceType({"typeName": "Test::Type", "writeOnlyProperties": ["/properties/Password"]})
+    assert resource_type.diff({"Name": "x"}, {"Name": "x", "Password": "secret"}) == []
+
+
+def test_resource_type_recursive_schema():
+    # shaped like AWS::WAFv2::WebACL, where statements nest through several branches
+    leaves = {"Leaf{0}".format(i): {"type": "array", "insertionOrder": False, "items": {"type": "string"}} for i in range(25)}
+    branches = {
+        "AndStatement": {"$ref": "#/definitions/StatementList"},
+        "OrStatement": {"$ref": "#/definitions/StatementList"},
+        "NotStatement": {"type": "object", "properties": {"Statement": {"$ref": "#/definitions/Statement"}}},
+        "RateBasedStatement": {"type": "object", "properties": {"ScopeDownStatement": {"$ref": "#/definitions/Statement"}}},
+        "ManagedRuleGroupStatement": {"type": "object", "properties": {"ScopeDownStatement": {"$ref": "#/definitions/Statement"}}},
+    }
+    schema = {
+        "typeName": "Test::Recursive::Type",
+        "definitions": {
+            "Statement": {"type": "object", "properties": dict(leaves, **branches)},
+            "StatementList": {
+                "type": "object",
+                "properties": {"Statements": {"type": "array", "items": {"$ref": "#/definitions/Statement"}}},
+            },
+        },
+        "properties": {"Rules": {"type": "array", "items": {"type": "object", "properties": {"Statement": {"$ref": "#/definitions/Statement"}}}}},
+    }
+    resource_type = ResourceType(schema)
+    assert len(resource_type.properties_index) == 1
+
+    path = ("Rules", "Statement") + ("AndStatement", "Statements", "NotStatement", "Statement", "RateBasedStatement", "ScopeDownStatement") * 5
+    assert resource_type.property_schema(path + ("Leaf3",))["insertionOrder"] is False
+    assert resource_type.property_schema(path + ("Unknown", "Leaf3")) == {}
+    # only the looked up paths are resolved
+    assert len(resource_type.properties_index) == len(path) + 4
+
+    existing = {"Rules": [{"Statement": {"OrStatement": {"Statements": [{"Leaf0": ["a", "b"]}]}}}]}
+    desired = {"Rules": [{"Statement": {"OrStatement": {"Statements": [{"Leaf0": ["b", "a"]}]}}}]}
+    assert resource_type.diff(existing, desired) == []
 
 
 def test_resource(mock_resource_type):
@@ -58,11 +167,10 @@ def test_resource(mock_resource_type):
     assert resource.identifier == "eda-test-role"
     assert resource.resource == RESOURCE
     assert resource.properties == RESOURCE["Properties"]
-    assert resource.read_only_properties == ["Arn", "RoleId"]
+    assert resource.read_only_properties == frozenset(["Arn", "RoleId"])
 
 
-@pytest.fixture(scope="module")
-def aws_client():
+def make_aws_client():
     class NotFound(Exception):
         pass
 
@@ -72,12 +180,31 @@ def aws_client():
             self.client = MagicMock()
             self.resources = Mock()
             self.check_mode = False
+            self.limiter = RateLimiter()
+            self.poller = Poller(Backoff(initial=0, maximum=0))
+            self.durations = Durations()
+            self.timeouts = Timeouts()
+            self.bulk_read = False
+            self.listed = {}
 
     resource = AwsClientMock()
     resource.client.exceptions.ResourceNotFoundException = NotFound
+    resource.client.get_resource_request_status.return_value = {"ProgressEvent": {"OperationStatus": "SUCCESS"}}
     return resource
 
 
+@pytest.fixture(scope="module")
+def aws_client():
+    return make_aws_client()
+
+
+@pytest.fixture
+def fresh_aws_client():
+    client = make_aws_client()
+    yield client
+    client.poller.close()
+
+
 @pytest.fixture(scope="module")
 def discoverer():
     class NotFound(Exception):
@@ -98,6 +225,49 @@ def test_discoverer(discoverer, mock_resource_type):
     assert result.read_only_properties == mock_resource_type.read_only_properties
 
 
+def test_discoverer_persistent_cache(tmp_path):
+    session = Mock()
+    session.region_name = "us-east-1"
+    first = Discoverer(session, cache=FileCache("schemas", path=str(tmp_path)))
+    first.client = MagicMock()
+    first.client.describe_type.return_value = {"Schema": json.dumps(SCHEMA)}
+    assert first.get("AWS::IAM::Role").type_name == "AWS::IAM::Role"
+
+    second = Discoverer(session, cache=FileCache("schemas", path=str(tmp_path)))
+    second.client = MagicMock()
+    assert second.get("AWS::IAM::Role").type_name == "AWS::IAM::Role"
+    second.client.describe_type.assert_not_called()
+
+
+def test_discoverer_single_flight():
+    session = Mock()
+    instance_discoverer = Discoverer(session)
+    instance_discoverer.client = MagicMock()
+    release = threading.Event()
+
+    def describe_type(**kwargs):
+        assert release.wait(timeout=5)
+        return {"Schema": json.dumps(SCHEMA)}
+
+    instance_discoverer.client.describe_type.side_effect = describe_type
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(instance_discoverer.get("AWS::IAM::Role"))) for _i in range(4)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert len(results) == 4
+    assert all(result is results[0] for result in results)
+    instance_discoverer.client.describe_type.assert_called_once()
+
+
+def test_prefetch(fresh_aws_client):
+    fresh_aws_client.prefetch({"role_1": RESOURCE, "role_2": RESOURCE, "bucket": {"Type": "AWS::S3::Bucket", "Properties": {}}}, {})
+    fresh_aws_client.resources.prefetch.assert_called_once_with({"AWS::IAM::Role", "AWS::S3::Bucket"})
+
+
 def test_discoverer_invalid_type(discoverer):
     discoverer.client.describe_type.side_effect = discoverer.client.exceptions.TypeNotFoundException
     with pytest.raises(Exception) as e:
@@ -149,3 +319,136 @@ def test_absent_not_found(get_resource, aws_client, mock_resource_type):
         "changed": False,
         "msg": "Skipped",
     }
+
+
+def progress_event(status, **kwargs):
+    return {"Operation": "CREATE", "OperationStatus": status, "RequestToken": "token", **kwargs}
+
+
+def test_wait_polls_until_success(fresh_aws_client):
+    fresh_aws_client.client.get_resource_request_status.side_effect = [
+        {"ProgressEvent": progress_event("IN_PROGRESS")},
+        {"ProgressEvent": progress_event("SUCCESS")},
+    ]
+    event = fresh_aws_client._wait(progress_event("PENDING"), "AWS::IAM::Role")
+    assert event["OperationStatus"] == "SUCCESS"
+    assert fresh_aws_client.durations.expected(("AWS::IAM::Role", "CREATE")) is not None
+
+
+def test_wait_rate_limits_polls(fresh_aws_client):
+    fresh_aws_client.limiter = MagicMock(wraps=fresh_aws_client.limiter)
+    fresh_aws_client.client.get_resource_request_status.side_effect = [
+        {"ProgressEvent": progress_event("IN_PROGRESS")},
+        {"ProgressEvent": progress_event("SUCCESS")},
+    ]
+    fresh_aws_client._wait(progress_event("PENDING"), "AWS::IAM::Role")
+    assert fresh_aws_client.limiter.request.call_args_list == [mock.call("AWS::IAM::Role")] * 2
+
+
+def test_wait_failed(fresh_aws_client):
+    with pytest.raises(CloudException, match="role already exists"):
+        fresh_aws_client._wait(progress_event("FAILED", StatusMessage="role already exists"), "AWS::IAM::Role")
+
+
+def test_wait_already_completed(fresh_aws_client):
+    event = fresh_aws_client._wait(progress_event("SUCCESS"), "AWS::IAM::Role")
+    assert event["OperationStatus"] == "SUCCESS"
+    fresh_aws_client.client.get_resource_request_status.assert_not_called()
+
+
+def test_wait_timeout(fresh_aws_client):
+    fresh_aws_client.timeouts = Timeouts({"AWS::IAM::*": 0})
+    fresh_aws_client.client.get_resource_request_status.return_value = {"ProgressEvent": progress_event("IN_PROGRESS")}
+    with pytest.raises(CloudException, match="Timed out"):
+        fresh_aws_client._wait(progress_event("IN_PROGRESS"), "AWS::IAM::Role")
+
+
+def test_present_unchanged_resource_reads_once(fresh_aws_client, mock_resource_type):
+    fresh_aws_client.resources.get.return_value = mock_resource_type
+    fresh_aws_client.client.get_resource.return_value = RESPONSE_GET
+    desired = {"Type": "AWS::IAM::Role", "Properties": json.loads(RESPONSE_GET["ResourceDescription"]["Properties"])}
+    result = fresh_aws_client.present(desired)
+    fresh_aws_client.client.get_resource.assert_called_once()
+    fresh_aws_client.client.update_resource.assert_not_called()
+    assert result == {**RESPONSE_OP_UPDATE, "changed": False, "msg": "Skipped"}
+
+
+def test_present_create_uses_resource_model(fresh_aws_client, mock_resource_type):
+    fresh_aws_client.resources.get.return_value = mock_resource_type
+    fresh_aws_client.client.get_resource.side_effect = fresh_aws_client.client.exceptions.ResourceNotFoundException
+    fresh_aws_client.client.create_resource.return_value = {
+        "ProgressEvent": progress_event("SUCCESS", ResourceModel=RESPONSE_GET["ResourceDescription"]["Properties"], Identifier="eda-test-role")
+    }
+    result = fresh_aws_client.present(RESOURCE)
+    fresh_aws_client.client.get_resource.assert_called_once()
+    assert result == RESPONSE_OP_CREATE
+
+
+def test_present_create_reads_incomplete_resource_model(fresh_aws_client, mock_resource_type):
+    model = json.loads(RESPONSE_GET["ResourceDescription"]["Properties"])
+    del model["Arn"]
+    fresh_aws_client.resources.get.return_value = mock_resource_type
+    fresh_aws_client.client.get_resource.side_effect = [fresh_aws_client.client.exceptions.ResourceNotFoundException, RESPONSE_GET]
+    fresh_aws_client.client.create_resource.return_value = {
+        "ProgressEvent": progress_event("SUCCESS", ResourceModel=json.dumps(model), Identifier="eda-test-role")
+    }
+    result = fresh_aws_client.present(RESOURCE)
+    assert fresh_aws_client.client.get_resource.call_count == 2
+    assert result == RESPONSE_OP_CREATE
+
+
+def test_prefetch_bulk_read(fresh_aws_client, mock_resource_type):
+    properties = json.loads(RESPONSE_GET["ResourceDescription"]["Properties"])
+    other = {**properties, "RoleName": "other-role"}
+    fresh_aws_client.resources.get.return_value = mock_resource_type
+    fresh_aws_client.client.list_resources.side_effect = [
+        {"ResourceDescriptions": [{"Identifier": "eda-test-role", "Properties": json.dumps(properties)}], "NextToken": "next"},
+        {"ResourceDescriptions": [{"Identifier": "other-role", "Properties": json.dumps(other)}]},
+    ]
+    fresh_aws_client.bulk_read = True
+    fresh_aws_client.prefetch({"role_1": RESOURCE, "role_2": RESOURCE}, {})
+    assert fresh_aws_client.listed == {"AWS::IAM::Role": {"eda-test-role": properties, "other-role": other}}
+    fresh_aws_client.client.list_resources.assert_called_with(TypeName="AWS::IAM::Role", NextToken="next")
+
+    desired = mock_resource_type.make({"RoleName": "other-role"})
+    assert fresh_aws_client._describe(desired).properties == other
+    assert fresh_aws_client._describe(mock_resource_type.make({"RoleName": "missing-role"})) is None
+    fresh_aws_client.client.get_resource.assert_not_called()
+
+
+def test_describe_identifier_only_listing(fresh_aws_client, mock_resource_type):
+    fresh_aws_client.client.get_resource.return_value = RESPONSE_GET
+    fresh_aws_client.listed = {"AWS::IAM::Role": {"eda-test-role": {"RoleName": "eda-test-role"}}}
+    existing = fresh_aws_client._describe(mock_resource_type.make({"RoleName": "eda-test-role"}))
+    fresh_aws_client.client.get_resource.assert_called_once()
+    assert existing.properties == json.loads(RESPONSE_GET["ResourceDescription"]["Properties"])
+
+
+def test_resource_type_listable():
+    handlers = {"list": {"permissions": []}}
+    assert ResourceType({"primaryIdentifier": ["/properties/Id"], "handlers": handlers}).listable
+    handlers = {"list": {"handlerSchema": {"properties": {"ClusterName": {"type": "string"}}, "required": ["ClusterName"]}}}
+    assert not ResourceType({"primaryIdentifier": ["/properties/Id"], "handlers": handlers}).listable
+    assert not ResourceType({"primaryIdentifier": ["/properties/Id"], "handlers": {}}).listable
+
+
+def test_prefetch_bulk_read_list_error(fresh_aws_client, mock_resource_type):
+    fresh_aws_client.resources.get.return_value = mock_resource_type
+    fresh_aws_client.client.list_resources.side_effect = ClientError({"Error": {"Code": "InvalidRequestException"}}, "ListResources")
+    fresh_aws_client.bulk_read = True
+    fresh_aws_client.prefetch({"role_1": RESOURCE, "role_2": RESOURCE}, {})
+    assert fresh_aws_client.listed == {}
+
+
+def test_describe_partial_listing(fresh_aws_client, mock_resource_type):
+    properties = json.loads(RESPONSE_GET["ResourceDescription"]["Properties"])
+    fresh_aws_client.client.get_resource.return_value = RESPONSE_GET
+    partial = {key: value for key, value in properties.items() if key != "Description"}
+    fresh_aws_client.listed = {"AWS::IAM::Role": {"eda-test-role": partial}}
+    # the listing holds every property set in the desired state
+    existing = fresh_aws_client._describe(mock_resource_type.make({"RoleName": "eda-test-role", "Path": "/"}))
+    assert existing.properties == partial
+    fresh_aws_client.client.get_resource.assert_not_called()
+    existing = fresh_aws_client._describe(mock_resource_type.make({"RoleName": "eda-test-role", "Description": "event-driven test role"}))
+    fresh_aws_client.client.get_resource.assert_called_once()
+    assert existing.properties == properties
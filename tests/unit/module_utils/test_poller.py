@@ -0,0 +1,99 @@
+# Copyright: (c) 2023, Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import threading
+
+import pytest
+
+from ansible_collections.pravic.pravic.plugins.module_utils.exception import CloudException
+from ansible_collections.pravic.pravic.plugins.module_utils.poller import Backoff, Durations, Poller, Timeouts
+
+
+@pytest.mark.parametrize("attempt,low,high", [(0, 0.125, 0.25), (1, 0.25, 0.5), (10, 5.0, 10.0)])
+def test_backoff(attempt, low, high):
+    delay = Backoff().delay(attempt)
+    assert low <= delay <= high
+
+
+def test_durations():
+    durations = Durations(alpha=0.5)
+    assert durations.expected("AWS::IAM::Role") is None
+    durations.record("AWS::IAM::Role", 2.0)
+    assert durations.expected("AWS::IAM::Role") == 2.0
+    durations.record("AWS::IAM::Role", 4.0)
+    assert durations.expected("AWS::IAM::Role") == 3.0
+
+
+def test_timeouts():
+    timeouts = Timeouts({"*": 600, "AWS::RDS::*": 3600, "AWS::RDS::DBInstance": 7200})
+    assert timeouts.get("AWS::IAM::Role") == 600
+    assert timeouts.get("AWS::RDS::DBCluster") == 3600
+    assert timeouts.get("AWS::RDS::DBInstance") == 7200
+    assert Timeouts().get("AWS::IAM::Role") == 300
+
+
+def test_poller_multiplexes_operations():
+    poller = Poller(Backoff(initial=0.01, maximum=0.01))
+    polls = {"a": 0, "b": 0}
+    threads = set()
+
+    def make_poll(name, rounds):
+        def poll():
+            threads.add(threading.current_thread().name)
+            polls[name] += 1
+            return (True, name) if polls[name] >= rounds else (False, None)
+
+        return poll
+
+    futures = [poller.watch(make_poll("a", 3), timeout=5), poller.watch(make_poll("b", 1), timeout=5)]
+    assert [f.result(timeout=5) for f in futures] == ["a", "b"]
+    assert polls == {"a": 3, "b": 1}
+    assert all(name.startswith("pravic-poll") for name in threads)
+
+
+def test_poller_hung_poll_does_not_stall_others():
+    poller = Poller(Backoff(initial=0.01, maximum=0.01), workers=2)
+    release = threading.Event()
+
+    def hung():
+        release.wait(5)
+        return True, "hung"
+
+    hung_future = poller.watch(hung, timeout=10, delay=0)
+    answers = iter([(False, None), (False, None), (True, "done")])
+    try:
+        assert poller.watch(lambda: next(answers), timeout=5, delay=0).result(timeout=2) == "done"
+        assert not hung_future.done()
+    finally:
+        release.set()
+    assert hung_future.result(timeout=5) == "hung"
+
+
+def test_poller_honours_poll_delay():
+    poller = Poller(Backoff(initial=60, maximum=60))
+    answers = iter([(False, 0.01), (True, "done")])
+    future = poller.watch(lambda: next(answers), timeout=5, delay=0)
+    assert future.result(timeout=5) == "done"
+
+
+def test_poller_errors():
+    poller = Poller(Backoff(initial=0.01, maximum=0.01))
+
+    def fail():
+        raise CloudException("failed")
+
+    with pytest.raises(CloudException, match="failed"):
+        poller.watch(fail, timeout=5).result(timeout=5)
+    with pytest.raises(CloudException, match="Timed out waiting for my request"):
+        poller.watch(lambda: (False, None), timeout=0.05, description="my request").result(timeout=5)
+
+
+def test_poller_close():
+    poller = Poller(Backoff(initial=0.01, maximum=0.01))
+    assert poller.watch(lambda: (True, 1), timeout=5, delay=0).result(timeout=5) == 1
+    thread = poller._thread
+    poller.close()
+    thread.join(5)
+    assert not thread.is_alive()
+    # the next operation starts the poller again
+    assert poller.watch(lambda: (True, 2), timeout=5, delay=0).result(timeout=5) == 2
@@ -1,18 +1,28 @@
 # Copyright: (c) 2023, Ansible Project
 # GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 
+import copy
+import threading
 from unittest.mock import MagicMock, patch, call
 import pytest
 from typing import Dict
 
 from ansible_collections.pravic.pravic.plugins.module_utils.resource import (
+    apply_refs,
+    compile_refs,
     get_value,
     replace_reference,
+    referenced,
     REREG,
     resolve_refs,
     CloudClient,
+    fingerprint,
+    RateLimiter,
+    state_keys,
     ResourceExceptionError,
+    TokenBucket,
 )
+from ansible_collections.pravic.pravic.plugins.module_utils.exception import CloudException
 
 PATCH_BASE_PATH = "ansible_collections.pravic.pravic.plugins.module_utils.resource."
 
@@ -90,6 +100,53 @@ def test_resolve_refs_with_check_mode(m_replace_reference):
     assert result == node
 
 
+def test_compile_refs():
+    node = {
+        "a": "resource:s1.a",
+        "b": ["plain", {"c": "prefix-resource:s2.b-suffix resource:s1.a"}],
+        "resource:s3.a": 1,
+    }
+    refs = compile_refs(node)
+    assert sorted(refs) == [
+        (("a",), [(0, 13, ["s1", "a"])]),
+        (("b", 1, "c"), [(7, 27, ["s2", "b-suffix"]), (28, 41, ["s1", "a"])]),
+    ]
+    assert referenced(refs) == {"s1", "s2"}
+
+
+def test_state_keys():
+    desired_state = {
+        "a": {"Type": "AWS::EC2::VPC", "Properties": {}},
+        "b": {"Type": "AWS::EC2::Subnet", "Properties": {"VpcId": "resource:a.Properties.VpcId", "Tags": ["resource:vpc.Properties.Tag"]}},
+    }
+    assert state_keys(desired_state) == {"a", "b", "vpc"}
+
+
+@pytest.mark.parametrize(
+    "node,expected",
+    [
+        ({"a": "resource:s1.a"}, {"a": "s1_value_a"}),
+        ({"a": "x-resource:s1.a y", "b": "resource:s2.b"}, {"a": "x-s1_value_a y", "b": "s2_value_b"}),
+        ({"c": ["resource:s1.a", "resource:s2.b"], "d": {"e": "f"}}, {"c": ["s1_value_a", "s2_value_b"], "d": {"e": "f"}}),
+        ({"a": "resource:s1.c"}, None),
+    ],
+)
+def test_apply_refs(node, expected):
+    context = {
+        "s1": {"a": "s1_value_a", "b": "s1_value_b"},
+        "s2": {"a": "s2_value_a", "b": "s2_value_b"},
+    }
+    original = copy.deepcopy(node)
+    if expected is None:
+        with pytest.raises(KeyError):
+            apply_refs(node, compile_refs(node), context, check_mode=False)
+        assert apply_refs(node, compile_refs(node), context, check_mode=True) == node
+    else:
+        assert apply_refs(node, compile_refs(node), context, check_mode=False) == expected
+        assert apply_refs(node, compile_refs(node), context, check_mode=False) == resolve_refs(node, context, check_mode=False)
+    assert node == original
+
+
 @pytest.fixture()
 def cloudclient():
     class TestCloudClient(CloudClient):
@@ -99,11 +156,7 @@ def cloudclient():
         def absent(self, resource: Dict) -> Dict:
             pass
 
-    client = TestCloudClient()
-    client.has_pyyaml = MagicMock()
-    client.has_pyyaml.return_value = True
-
-    return client
+    return TestCloudClient()
 
 
 @pytest.mark.parametrize("state", ["present", "absent"])
@@ -199,3 +252,298 @@ def test_cloudclient_run_present_with_checkmode(cloudclient):
             call({"ref": "resource:parent.id"}),
         ]
     )
+
+
+def test_cloudclient_run_schedules_dependents_eagerly(cloudclient):
+    desired_state = {
+        "slow": {"name": "slow"},
+        "fast": {"name": "fast"},
+        "child": {"name": "child", "ref": "resource:fast.name"},
+    }
+    child_started = threading.Event()
+
+    def present(node):
+        if node["name"] == "slow":
+            # the dependent of "fast" must not wait for "slow" to complete
+            assert child_started.wait(timeout=5)
+        elif node["name"] == "child":
+            child_started.set()
+        return {"changed": False, **node}
+
+    cloudclient.present = MagicMock(side_effect=present)
+    result = cloudclient.run(desired_state, {}, "present", False)
+
+    assert result["child"] == {"changed": False, "name": "child", "ref": "fast"}
+    assert cloudclient.present.call_count == 3
+
+
+def test_cloudclient_run_skipped_nodes_unblock_dependents_eagerly(cloudclient):
+    # y is not in the state, so x, deleted after y, is ready at once
+    desired_state = {"a": {"name": "a"}, "x": {"name": "x"}, "y": {"name": "y", "ref": "resource:x.name"}}
+    current_state = {"a": {"name": "a"}, "x": {"name": "x"}}
+    x_started = threading.Event()
+
+    def absent(node):
+        if node["name"] == "a":
+            assert x_started.wait(timeout=5)
+        else:
+            x_started.set()
+        return {}
+
+    cloudclient.absent = MagicMock(side_effect=absent)
+    result = cloudclient.run(desired_state, current_state, "absent", False)
+
+    assert result == {"changed": False}
+    assert cloudclient.absent.call_count == 2
+
+
+def test_cloudclient_run_prefetches(cloudclient):
+    desired_state = {"parent": {}, "child": {"ref": "resource:parent.id"}}
+    events = []
+    cloudclient.prefetch = MagicMock(side_effect=lambda *args: events.append("prefetch"))
+    cloudclient.present = MagicMock(side_effect=lambda node: events.append("present") or {"changed": False, "id": "id"})
+
+    cloudclient.run(desired_state, {}, "present", False)
+    cloudclient.prefetch.assert_called_once()
+    assert cloudclient.prefetch.call_args[0][0] == desired_state
+    assert events == ["prefetch", "present", "present"]
+
+
+def test_cloudclient_critical_path(cloudclient):
+    desired_state = {
+        "tag": {},
+        "vpc": {},
+        "subnet": {"vpc": "resource:vpc.id"},
+        "instance": {"subnet": "resource:subnet.id"},
+    }
+    graph = cloudclient.dependency_graph(desired_state, "present")
+    assert cloudclient.critical_path(graph) == {"tag": 1, "vpc": 3, "subnet": 2, "instance": 1}
+
+
+def test_cloudclient_run_starts_longest_chain_first(cloudclient):
+    desired_state = {
+        "tag_1": {"name": "tag_1"},
+        "tag_2": {"name": "tag_2"},
+        "vpc": {"name": "vpc"},
+        "subnet": {"name": "subnet", "vpc": "resource:vpc.name"},
+        "instance": {"name": "instance", "subnet": "resource:subnet.name"},
+    }
+    order = []
+
+    def present(node):
+        order.append(node["name"])
+        return {"changed": False, **node}
+
+    cloudclient.present = MagicMock(side_effect=present)
+    cloudclient.run(desired_state, {}, "present", False, max_workers=1)
+
+    assert order[:2] == ["vpc", "subnet"]
+
+
+@pytest.mark.parametrize("max_workers", [0, -1])
+def test_cloudclient_run_invalid_max_workers(cloudclient, max_workers):
+    cloudclient.present = MagicMock()
+    with pytest.raises(CloudException, match="max_workers must be at least 1"):
+        cloudclient.run({"vpc": {"name": "vpc"}}, {}, "present", False, max_workers=max_workers)
+    cloudclient.present.assert_not_called()
+
+
+@patch(PATCH_BASE_PATH + "time")
+def test_token_bucket(m_time):
+    m_time.monotonic.return_value = 100.0
+    bucket = TokenBucket(rate=2, burst=2)
+    bucket.acquire()
+    bucket.acquire()
+    m_time.sleep.assert_not_called()
+
+    def sleep(delay):
+        m_time.monotonic.return_value += delay
+
+    m_time.sleep.side_effect = sleep
+    bucket.acquire()
+    m_time.sleep.assert_called_once_with(0.5)
+
+
+def test_rate_limiter_matching_rules():
+    limiter = RateLimiter({"*": {"rate": 10}, "AWS::EC2::*": {"concurrency": 1}})
+    assert [rule[0] for rule in limiter._matching("AWS::EC2::VPC")] == ["*", "AWS::EC2::*"]
+    assert [rule[0] for rule in limiter._matching("AWS::IAM::Role")] == ["*"]
+
+
+def test_rate_limiter_concurrency():
+    limiter = RateLimiter({"AWS::EC2::*": {"concurrency": 1}})
+    semaphore = limiter._matching("AWS::EC2::VPC")[0][2]
+    with limiter.mutation("AWS::EC2::VPC"):
+        assert not semaphore.acquire(blocking=False)
+        with limiter.mutation("AWS::IAM::Role"):
+            pass
+    assert semaphore.acquire(blocking=False)
+
+
+def test_rate_limiter_invalid_limits():
+    with pytest.raises(CloudException):
+        RateLimiter({"*": {"requests": 10}})
+
+
+def test_fingerprint():
+    assert fingerprint({"a": 1, "b": [1, 2]}) == fingerprint({"b": [1, 2], "a": 1})
+    assert fingerprint({"a": 1}) != fingerprint({"a": 2})
+
+
+def test_cloudclient_run_trust_state(cloudclient):
+    desired_state = {"parent": {"name": "parent"}, "child": {"name": "child", "ref": "resource:parent.name"}}
+    cloudclient.present = MagicMock(side_effect=lambda node: {"changed": True, **node, "msg": "Created"})
+
+    state = cloudclient.run(desired_state, {}, "present", False, trust_state=True)
+    assert state["child"]["fingerprint"] == fingerprint({"name": "child", "ref": "parent"})
+    assert cloudclient.present.call_count == 2
+
+    cloudclient.present.reset_mock()
+    desired_state["child"]["extra"] = "value"
+    state = cloudclient.run(desired_state, state, "present", False, trust_state=True)
+    cloudclient.present.assert_called_once_with({"name": "child", "ref": "parent", "extra": "value"})
+    assert state["parent"]["changed"] is False
+    assert state["parent"]["msg"] == "Skipped"
+    assert state["changed"] is True
+
+
+def test_cloudclient_run_trust_state_skipped_nodes_unblock_dependents_eagerly(cloudclient):
+    desired_state = {
+        "a": {"name": "a"},
+        "d": {"name": "d", "size": 2},
+        "b": {"name": "b", "ref": "resource:d.name"},
+        "c": {"name": "c", "ref": "resource:b.name"},
+    }
+    current_state = {
+        "d": {"name": "d", "fingerprint": fingerprint({"name": "d", "size": 1})},
+        "b": {"name": "b", "msg": "Created", "fingerprint": fingerprint({"name": "b", "ref": "d"})},
+        "c": {"name": "c", "fingerprint": fingerprint({"name": "c", "ref": "b", "size": 1})},
+    }
+    c_started = threading.Event()
+
+    def present(node):
+        if node["name"] == "a":
+            # b resolves as before once d is applied, and c, which changed,
+            # must not wait for a
+            assert c_started.wait(timeout=5)
+        elif node["name"] == "c":
+            c_started.set()
+        return {"changed": False, **node}
+
+    cloudclient.present = MagicMock(side_effect=present)
+    state = cloudclient.run(desired_state, current_state, "present", False, trust_state=True)
+
+    assert state["b"]["msg"] == "Skipped"
+    assert sorted(call.args[0]["name"] for call in cloudclient.present.call_args_list) == ["a", "c", "d"]
+
+
+@patch(PATCH_BASE_PATH + "random")
+def test_cloudclient_run_trust_state_drift_check(m_random, cloudclient):
+    desired_state = {"parent": {"name": "parent"}}
+    current_state = {"parent": {"changed": False, "name": "parent", "fingerprint": fingerprint({"name": "parent"})}}
+    cloudclient.present = MagicMock(return_value={"changed": False, "name": "parent"})
+
+    m_random.random.return_value = 0.4
+    cloudclient.run(desired_state, current_state, "present", False, trust_state=True, drift_check_ratio=0.5)
+    cloudclient.present.assert_called_once_with({"name": "parent"})
+
+    cloudclient.present.reset_mock()
+    m_random.random.return_value = 0.6
+    cloudclient.run(desired_state, current_state, "present", False, trust_state=True, drift_check_ratio=0.5)
+    cloudclient.present.assert_not_called()
+
+
+def test_cloudclient_run_trust_state_check_mode(cloudclient):
+    desired_state = {"parent": {"name": "parent"}}
+    current_state = {"parent": {"changed": False, "name": "parent", "fingerprint": fingerprint({"name": "parent"})}}
+    cloudclient.present = MagicMock(return_value={"changed": False, "name": "parent"})
+    result = cloudclient.run(desired_state, current_state, "present", True, trust_state=True)
+    cloudclient.present.assert_called_once()
+    assert "fingerprint" not in result["parent"]
+
+
+def test_cloudclient_plan(cloudclient):
+    desired_state = {
+        "vpc": {"name": "vpc"},
+        "subnet": {"name": "subnet", "vpc": "resource:vpc.name"},
+        "instance": {"name": "instance", "subnet": "resource:subnet.name"},
+        "role": {"name": "role", "tag": "v2"},
+        "bucket": {"name": "bucket"},
+    }
+    current_state = {
+        "vpc": {"name": "vpc", "fingerprint": fingerprint({"name": "vpc"})},
+        "subnet": {"name": "subnet", "fingerprint": fingerprint({"name": "subnet", "vpc": "vpc"})},
+        "instance": {"name": "instance", "fingerprint": fingerprint({"name": "instance", "subnet": "subnet"})},
+        "role": {"name": "role", "fingerprint": fingerprint({"name": "role", "tag": "v1"})},
+        "bucket": {"name": "bucket", "fingerprint": fingerprint({"name": "bucket"})},
+    }
+    compiled = cloudclient.compile_resources(desired_state)
+    graph = cloudclient.dependency_graph(desired_state, "present", compiled)
+
+    assert cloudclient.plan(desired_state, current_state, graph, compiled, set()) == {"role"}
+    assert cloudclient.plan(desired_state, current_state, graph, compiled, {"subnet"}) == {"role", "subnet", "instance"}
+    desired_state["vpc"]["cidr"] = "10.0.0.0/16"
+    assert cloudclient.plan(desired_state, current_state, graph, compiled, set()) == {"role", "vpc", "subnet", "instance"}
+
+
+def test_cloudclient_run_incremental(cloudclient):
+    desired_state = {"vpc": {"name": "vpc"}, "subnet": {"name": "subnet", "vpc": "resource:vpc.name"}, "role": {"name": "role"}}
+    current_state = {
+        "vpc": {"changed": True, "name": "vpc", "fingerprint": fingerprint({"name": "vpc"})},
+        "subnet": {"changed": True, "name": "subnet", "fingerprint": fingerprint({"name": "subnet", "vpc": "vpc"})},
+        "role": {"changed": True, "name": "role", "fingerprint": fingerprint({"name": "role"})},
+    }
+    desired_state["vpc"]["cidr"] = "10.0.0.0/16"
+    cloudclient.prefetch = MagicMock()
+    # the vpc keeps its name, so the subnet resolves as before and is not sent
+    cloudclient.present = MagicMock(side_effect=lambda node: {"changed": True, **node})
+
+    result = cloudclient.run(desired_state, current_state, "present", False, trust_state=True)
+    cloudclient.present.assert_called_once_with({"name": "vpc", "cidr": "10.0.0.0/16"})
+    assert set(cloudclient.prefetch.call_args[0][0]) == {"vpc", "subnet"}
+    assert result["role"]["changed"] is False
+    assert result["subnet"]["changed"] is False
+    assert result["changed"] is True
+
+
+@pytest.mark.parametrize(
+    "state,targets,expected",
+    [
+        ("present", ["subnet"], {"vpc", "subnet"}),
+        ("present", ["role"], {"role"}),
+        ("absent", ["subnet"], {"subnet", "instance"}),
+        ("absent", ["instance", "role"], {"instance", "role"}),
+    ],
+)
+def test_cloudclient_run_targets(cloudclient, state, targets, expected):
+    desired_state = {
+        "vpc": {"name": "vpc"},
+        "subnet": {"name": "subnet", "vpc": "resource:vpc.name"},
+        "instance": {"name": "instance", "subnet": "resource:subnet.name"},
+        "role": {"name": "role"},
+    }
+    current_state = {name: {"changed": False, **node} for name, node in desired_state.items()}
+    processed = set()
+
+    def handler(node):
+        processed.add(node["name"])
+        return {"changed": True, **node}
+
+    cloudclient.present = MagicMock(side_effect=handler)
+    cloudclient.absent = MagicMock(side_effect=handler)
+    result = cloudclient.run(desired_state, current_state, state, False, targets=targets)
+
+    assert processed == expected
+    for name in desired_state.keys() - expected:
+        assert result[name]["changed"] is False
+
+
+def test_cloudclient_run_unknown_targets(cloudclient):
+    with pytest.raises(CloudException, match="Unknown targets: missing"):
+        cloudclient.run({"vpc": {}}, {}, "present", False, targets=["vpc", "missing"])
+
+
+@pytest.mark.parametrize("ratio", [-0.1, 1.5])
+def test_cloudclient_run_invalid_drift_check_ratio(cloudclient, ratio):
+    with pytest.raises(CloudException, match="drift_check_ratio must be between 0.0 and 1.0"):
+        cloudclient.run({"vpc": {"name": "vpc"}}, {}, "present", False, trust_state=True, drift_check_ratio=ratio)
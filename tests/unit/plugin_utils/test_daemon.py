@@ -0,0 +1,110 @@
+# Copyright: (c) 2023, Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import socket
+import threading
+from unittest.mock import MagicMock, patch
+
+from ansible_collections.pravic.pravic.plugins.plugin_utils import daemon
+
+PATCH_BASE_PATH = "ansible_collections.pravic.pravic.plugins.plugin_utils.daemon."
+
+
+def params(**kwargs):
+    return dict({"client": "aws", "connection": {"region_name": "us-east-1"}, "resources": {}, "state": "present"}, **kwargs)
+
+
+@patch(PATCH_BASE_PATH + "run_client")
+@patch(PATCH_BASE_PATH + "make_client")
+def test_worker_reuses_clients(m_make_client, m_run_client):
+    m_make_client.side_effect = lambda params, check_mode: MagicMock()
+    m_run_client.return_value = {"changed": False, "resources": {"changed": False}}
+    worker = daemon.Worker()
+
+    assert worker.execute(params(), False) == {"changed": False, "resources": {"changed": False}}
+    worker.execute(params(resources={"a": {}}), False)
+    assert m_make_client.call_count == 1
+    assert m_run_client.call_args_list[0][0][0] is m_run_client.call_args_list[1][0][0]
+
+    worker.execute(params(), True)
+    worker.execute(params(connection={"region_name": "eu-west-1"}), False)
+    assert m_make_client.call_count == 3
+
+
+@patch(PATCH_BASE_PATH + "make_client")
+def test_worker_reports_failures(m_make_client):
+    m_make_client.side_effect = ValueError("bad connection")
+    worker = daemon.Worker()
+    result = worker.handle({"params": params(), "check_mode": False})
+    assert result["failed"] is True
+    assert result["msg"] == "bad connection"
+    assert "ValueError" in result["exception"]
+
+
+def test_framing():
+    left, right = socket.socketpair()
+    with left, right:
+        message = {"resources": {"name": "x" * 100000}}
+        daemon.send(left, message)
+        assert daemon.receive(right) == message
+
+
+@patch(PATCH_BASE_PATH + "run_client")
+@patch(PATCH_BASE_PATH + "make_client")
+def test_server(m_make_client, m_run_client, tmp_path):
+    m_run_client.side_effect = lambda client, params, check_mode: {"changed": check_mode, "resources": params["resources"]}
+    path = str(tmp_path / "d.sock")
+    server = daemon.Server(path, idle_timeout=0.2)
+    thread = threading.Thread(target=server.serve)
+    thread.start()
+
+    assert daemon.execute(params(resources={"a": {}}), True, path=path) == {"changed": True, "resources": {"a": {}}}
+    assert daemon.execute(params(), False, path=path) == {"changed": False, "resources": {}}
+    assert m_make_client.call_count == 2
+
+    # the daemon exits once idle and removes its socket
+    thread.join(5)
+    assert not thread.is_alive()
+    assert not (tmp_path / "d.sock").exists()
+
+
+@patch(PATCH_BASE_PATH + "run_client")
+@patch(PATCH_BASE_PATH + "make_client")
+def test_worker_evicts_clients(m_make_client, m_run_client):
+    clients = []
+    m_make_client.side_effect = lambda params, check_mode: clients.append(MagicMock()) or clients[-1]
+    worker = daemon.Worker(max_clients=2)
+    for region in ("us-east-1", "eu-west-1", "us-east-1", "ap-south-1"):
+        worker.execute(params(connection={"region_name": region}), False)
+    # eu-west-1 is the least recently used client
+    assert m_make_client.call_count == 3
+    clients[1].close.assert_called_once()
+    assert not clients[0].close.called
+
+    worker.idle_timeout = 0
+    worker.execute(params(connection={"region_name": "us-east-1"}), False)
+    clients[2].close.assert_called_once()
+    assert not clients[0].close.called
+
+
+def test_execute_retries_closed_connection():
+    sockets = []
+
+    def connect(path):
+        left, right = socket.socketpair()
+        if not sockets:
+            # a daemon exiting on idle
+            right.close()
+        else:
+
+            def answer():
+                with right:
+                    daemon.send(right, {"changed": False, "request": daemon.receive(right)["check_mode"]})
+
+            threading.Thread(target=answer).start()
+        sockets.append(left)
+        return left
+
+    with patch(PATCH_BASE_PATH + "connect", side_effect=connect):
+        assert daemon.execute(params(), True) == {"changed": False, "request": True}
+    assert len(sockets) == 2
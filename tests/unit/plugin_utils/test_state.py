@@ -0,0 +1,82 @@
+# Copyright: (c) 2023, Ansible Project
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import json
+
+import pytest
+
+from ansible_collections.pravic.pravic.plugins.plugin_utils.state import JournalState, JsonFileState, SqliteState, get_backend
+
+
+@pytest.mark.parametrize("backend", [JsonFileState, JournalState, SqliteState])
+def test_state_backend(backend, tmp_path):
+    state = backend(str(tmp_path / "state.json"))
+    assert state.load() == {}
+    state.update({"a": {"Type": "AWS::S3::Bucket"}, "b": {"Type": "AWS::SQS::Queue"}})
+    state.update({"a": None, "c": {"Type": "AWS::SNS::Topic"}})
+    assert state.load() == {"b": {"Type": "AWS::SQS::Queue"}, "c": {"Type": "AWS::SNS::Topic"}}
+    assert state.load(["a", "b"]) == {"b": {"Type": "AWS::SQS::Queue"}}
+    assert backend(str(tmp_path / "state.json")).load() == state.load()
+
+
+def test_journal_state_reads_json_state(tmp_path):
+    path = tmp_path / "state.json"
+    path.write_text(json.dumps({"a": {"Type": "AWS::S3::Bucket"}}))
+    state = JournalState(str(path))
+    state.update({"b": {"Type": "AWS::SQS::Queue"}})
+    # only the journal is written
+    assert json.loads(path.read_text()) == {"a": {"Type": "AWS::S3::Bucket"}}
+    assert (tmp_path / "state.json.journal").read_text().count("\n") == 1
+    assert state.load() == {"a": {"Type": "AWS::S3::Bucket"}, "b": {"Type": "AWS::SQS::Queue"}}
+
+
+def test_journal_state_compaction(tmp_path):
+    path = tmp_path / "state.json"
+    state = JournalState(str(path))
+    state.COMPACT_SIZE = 200
+    for i in range(10):
+        state.update({"r{0}".format(i): {"Type": "AWS::S3::Bucket", "Properties": {"BucketName": "bucket-{0}".format(i)}}})
+    assert json.loads(path.read_text())
+    assert (tmp_path / "state.json.journal").stat().st_size <= max(200, path.stat().st_size)
+    assert sorted(state.load()) == ["r{0}".format(i) for i in range(10)]
+
+
+def test_journal_state_interrupted_update(tmp_path):
+    state = JournalState(str(tmp_path / "state.json"))
+    state.update({"a": {"Type": "AWS::S3::Bucket"}})
+    with open(state.journal, "a") as fp:
+        fp.write('{"name": "b", "val')
+    assert state.load() == {"a": {"Type": "AWS::S3::Bucket"}}
+    state.update({"c": {"Type": "AWS::SQS::Queue"}})
+    assert state.load() == {"a": {"Type": "AWS::S3::Bucket"}, "c": {"Type": "AWS::SQS::Queue"}}
+
+
+def test_journal_state_flush(tmp_path):
+    path = tmp_path / "state.json"
+    state = JournalState(str(path))
+    state.flush()
+    state.update({"a": {"Type": "AWS::S3::Bucket"}})
+    assert not path.exists()
+    state.flush()
+    assert json.loads(path.read_text()) == {"a": {"Type": "AWS::S3::Bucket"}}
+    assert (tmp_path / "state.json.journal").stat().st_size == 0
+
+
+def test_sqlite_state(tmp_path):
+    state = SqliteState(str(tmp_path / "state.db"))
+    bucket = {"Type": "AWS::S3::Bucket", "Properties": {"Arn": "arn:aws:s3:::b1"}}
+    state.update({"b1": bucket, "b2": {"Type": "AWS::S3::Bucket", "Properties": {}}})
+    assert state.load(["b1", "missing"]) == {"b1": bucket}
+
+    state.update({"b1": dict(bucket, Properties={"Arn": "arn:aws:s3:::b3"}), "b2": None})
+    assert state.load() == {"b1": dict(bucket, Properties={"Arn": "arn:aws:s3:::b3"})}
+    # keys are looked up in batches
+    assert state.load(["b{0}".format(i) for i in range(1200)]).keys() == {"b1"}
+
+
+def test_get_backend(tmp_path):
+    assert isinstance(get_backend(None, str(tmp_path / "state.json")), JsonFileState)
+    assert isinstance(get_backend("journal", str(tmp_path / "state.json")), JournalState)
+    assert isinstance(get_backend("json", str(tmp_path / "state.json")), JsonFileState)
+    with pytest.raises(ValueError):
+        get_backend("yaml", str(tmp_path / "state.json"))